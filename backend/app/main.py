@@ -1,3 +1,5 @@
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
@@ -41,6 +43,13 @@ async def startup():
 
     logger.info("Database connected and tables ensured.")
 
+    # Server-side video processing: build MediaPipe graphs before the first request
+    pool_size = int(os.getenv("MEDIAPIPE_POOL_SIZE", 0))
+    if pool_size > 0:
+        from pipelines.graph_pool import enable_graph_pools
+        enable_graph_pools(size=pool_size)
+        logger.info(f"MediaPipe graph pools warmed ({pool_size} per stage).")
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
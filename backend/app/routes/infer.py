@@ -99,7 +99,7 @@ async def infer_video(
             }
 
         # 1. Feature extraction
-        feature_dicts = extract_features(sequence_data, fps=fps)
+        feature_dicts = extract_features(sequence_data, fps=fps, features=FEATURE_KEYS)
 
         if not feature_dicts:
             session_obj.status = "pending"
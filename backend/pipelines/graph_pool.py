@@ -0,0 +1,131 @@
+"""
+Warm pools of reusable MediaPipe graphs for server-side processing.
+
+Building a MediaPipe graph costs hundreds of milliseconds. With pools
+enabled, every `with open_graph(kind, factory)` in steps 2 and 3 checks a
+pre-built graph out of a bounded per-process pool instead of constructing
+one, and returns it afterwards with its tracking state reset so the next
+video starts clean. With pools disabled (the default, e.g. for scripts)
+open_graph builds and closes a fresh graph exactly as before.
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+_pools = {}
+_pools_lock = threading.Lock()
+_enabled = False
+
+
+class GraphPool:
+    """
+    Bounded pool of graphs built by `factory`. Graphs are created lazily up
+    to `size`; once all are checked out, checkout() blocks until one is
+    returned.
+    """
+
+    def __init__(self, factory, size=2):
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self, timeout=None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self.factory()
+
+        return self._idle.get(timeout=timeout)
+
+    def _release(self, graph):
+        # Clear tracking state so the next video does not inherit it
+        graph.reset()
+        self._idle.put(graph)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        graph = self._acquire(timeout)
+        try:
+            yield graph
+        finally:
+            self._release(graph)
+
+    def warm_up(self, frame_shape=(360, 640, 3)):
+        """Builds every graph up front and runs one blank frame through each."""
+        blank = np.zeros(frame_shape, dtype=np.uint8)
+        graphs = [self._acquire() for _ in range(self.size)]
+        for graph in graphs:
+            graph.process(blank)
+        for graph in graphs:
+            self._release(graph)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def get_pool(kind, factory, size=2):
+    with _pools_lock:
+        if kind not in _pools:
+            _pools[kind] = GraphPool(factory, size)
+        return _pools[kind]
+
+
+@contextmanager
+def open_graph(kind, factory):
+    """Pooled graph when pools are enabled, otherwise a fresh one."""
+    if not _enabled:
+        with factory() as graph:
+            yield graph
+        return
+
+    with get_pool(kind, factory).checkout() as graph:
+        yield graph
+
+
+def enable_graph_pools(size=2, warm_up=True):
+    """
+    Turns pooling on for this process and, by default, builds and warms
+    `size` graphs per stage so the first request does not pay for it.
+    """
+    global _enabled
+
+    # Imported here: the step modules themselves depend on open_graph
+    from pipelines.step2_preprocessing.face_filter import create_face_detector
+    from pipelines.step3_pose_gaze.face_mesh import create_face_mesh_model, create_face_roi_model
+    from pipelines.step3_pose_gaze.pose_extractor import create_pose_model
+
+    _enabled = True
+
+    for kind, factory in (
+        ("face_detection", create_face_detector),
+        ("pose", create_pose_model),
+        ("face_mesh", create_face_mesh_model),
+        ("face_mesh_roi", create_face_roi_model),
+    ):
+        pool = get_pool(kind, factory, size)
+        if warm_up:
+            pool.warm_up()
+
+
+def disable_graph_pools():
+    global _enabled
+    _enabled = False
+
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -1,19 +1,150 @@
+import cv2
 import mediapipe as mp
 import numpy as np
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pipelines.graph_pool import open_graph
 
 mp_face = mp.solutions.face_detection
 
-def detect_faces(frames: List[np.ndarray]) -> List[int]:
-    face_counts = []
 
-    with mp_face.FaceDetection(model_selection=0, min_detection_confidence=0.3) as detector:
+def create_face_detector():
+    return mp_face.FaceDetection(model_selection=0, min_detection_confidence=0.3)
+
+
+# Relative (xmin, ymin, width, height), as reported by MediaPipe
+FaceBox = Tuple[float, float, float, float]
+
+
+def detect_face_boxes(detector, frame: np.ndarray) -> List[FaceBox]:
+    results = detector.process(frame)
+    if not results.detections:
+        return []
+
+    boxes = []
+    for det in results.detections:
+        bb = det.location_data.relative_bounding_box
+        boxes.append((float(bb.xmin), float(bb.ymin), float(bb.width), float(bb.height)))
+    return boxes
+
+
+def count_faces(detector, frame: np.ndarray) -> int:
+    return len(detect_face_boxes(detector, frame))
+
+
+class FaceCountTracker:
+    """
+    Detect-every-N face counting.
+
+    The detector runs on the first frame, then at most every `every_n`
+    frames, or earlier when the mean absolute difference of a small
+    grayscale thumbnail against the last detected frame exceeds
+    `diff_threshold` (0-255 scale). In between, the last count is
+    carried forward. every_n=1 is the dense mode.
+
+    `box` is the bounding box of the single detected face (None unless
+    exactly one face was found), carried forward the same way.
+    """
+
+    def __init__(
+        self,
+        detector,
+        every_n: int = 5,
+        diff_threshold: float = 8.0,
+        thumb_width: int = 64
+    ):
+        self.detector = detector
+        self.every_n = max(int(every_n), 1)
+        self.diff_threshold = diff_threshold
+        self.thumb_width = thumb_width
+
+        self.frames_seen = 0
+        self.detector_calls = 0
+
+        self._last_count = 0
+        self.box: Optional[FaceBox] = None
+        self._last_thumb = None
+        self._since_detect = 0
+
+    @property
+    def saved_calls(self) -> int:
+        return self.frames_seen - self.detector_calls
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        size = (self.thumb_width, max(int(h * self.thumb_width / w), 1))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY).astype(np.int16)
+
+    def _detect(self, frame: np.ndarray) -> int:
+        boxes = detect_face_boxes(self.detector, frame)
+        self._last_count = len(boxes)
+        self.box = boxes[0] if len(boxes) == 1 else None
+        return self._last_count
+
+    def count(self, frame: np.ndarray) -> int:
+        self.frames_seen += 1
+
+        if self.every_n == 1:
+            self.detector_calls += 1
+            return self._detect(frame)
+
+        thumb = self._thumbnail(frame)
+        self._since_detect += 1
+
+        changed = (
+            self._last_thumb is None
+            or self._since_detect >= self.every_n
+            or np.abs(thumb - self._last_thumb).mean() > self.diff_threshold
+        )
+
+        if changed:
+            self._detect(frame)
+            self._last_thumb = thumb
+            self._since_detect = 0
+            self.detector_calls += 1
+
+        return self._last_count
+
+    def report(self) -> Dict[str, int]:
+        return {
+            "frames": self.frames_seen,
+            "detector_calls": self.detector_calls,
+            "saved_calls": self.saved_calls,
+        }
+
+
+def iter_face_counts(
+    frames: Iterable[np.ndarray],
+    every_n: int = 1,
+    diff_threshold: float = 8.0
+) -> Iterator[int]:
+    """
+    Lazily yields the face count for each frame.
+    Works on lists and on one-pass frame streams alike.
+    """
+    with open_graph("face_detection", create_face_detector) as detector:
+        tracker = FaceCountTracker(detector, every_n, diff_threshold)
         for frame in frames:
-            results = detector.process(frame)
-            if results.detections:
-                face_counts.append(len(results.detections))
-            else:
-                face_counts.append(0)
+            yield tracker.count(frame)
+
+
+def detect_faces(frames: List[np.ndarray]) -> List[int]:
+    return list(iter_face_counts(frames))
+
 
-    return face_counts
+def detect_faces_sparse(
+    frames: Iterable[np.ndarray],
+    every_n: int = 5,
+    diff_threshold: float = 8.0
+) -> Tuple[List[int], Dict[str, int]]:
+    """
+    Detect-every-N variant of detect_faces.
+    Returns (face_counts, report), where report says how many detector
+    calls were made and how many were saved versus the dense mode.
+    """
+    with open_graph("face_detection", create_face_detector) as detector:
+        tracker = FaceCountTracker(detector, every_n, diff_threshold)
+        face_counts = [tracker.count(frame) for frame in frames]
 
+    return face_counts, tracker.report()
@@ -1,30 +1,290 @@
-from typing import Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
 
-from .video_loader import load_and_resample_video
+import numpy as np
+
+from pipelines.graph_pool import open_graph
+from .face_filter import count_faces, create_face_detector
+from .video_loader import (
+    get_video_info,
+    iter_resampled_frames,
+    load_and_resample_video,
+    read_frames_at
+)
 from .validity import (
+    VALIDITY_CHUNK_SIZE,
+    IncrementalQualityEvaluator,
     build_validity_mask_with_stats,
-    evaluate_video_quality
+    evaluate_video_quality,
+    iter_validity,
+    merge_validity_stats,
+    new_validity_stats,
+    validate_frame_batch
 )
 
-def preprocess_video(video_path: str) -> Dict:
-    frames, timestamps = load_and_resample_video(video_path)
 
-    validity = build_validity_mask_with_stats(frames)
-    valid_mask = validity["valid_mask"]
-    stats = validity["stats"]
+def _empty_result() -> Dict:
+    return {"frames": [], "timestamps": [], "valid_mask": [], "face_boxes": []}
+
+
+def _append_frame(result: Dict, frame, t, valid, box, keep_frames: bool):
+    if keep_frames:
+        result["frames"].append(frame)
+    result["timestamps"].append(t)
+    result["valid_mask"].append(valid)
+    result["face_boxes"].append(box)
+
+
+def _preprocess_segment(args: Tuple[str, int, Optional[int], bool, int]) -> Dict:
+    """
+    Worker for segment-parallel preprocessing: decodes, resamples and
+    validates output frames [start, stop) of one video.
+    """
+    video_path, start, stop, keep_frames, face_every_n = args
+
+    result = _empty_result()
+    result["stats"] = new_validity_stats()
+
+    stream = iter_resampled_frames(video_path, start=start, stop=stop)
+    for frame, t, valid, box in iter_validity(
+        stream, result["stats"], face_every_n=face_every_n, with_boxes=True
+    ):
+        _append_frame(result, frame, t, valid, box, keep_frames)
+
+    return result
+
+
+def _preprocess_parallel(
+    video_path: str,
+    num_workers: int,
+    keep_frames: bool,
+    face_every_n: int
+) -> Dict:
+    n_out = get_video_info(video_path)["num_output_frames"]
+
+    # Segment edges in output-frame units. The last segment is open-ended
+    # because container frame counts are only an estimate.
+    edges = np.linspace(0, n_out, num_workers + 1).astype(int).tolist()
+    jobs = [
+        (
+            video_path,
+            edges[i],
+            edges[i + 1] if i < num_workers - 1 else None,
+            keep_frames,
+            face_every_n
+        )
+        for i in range(num_workers)
+        if i == num_workers - 1 or edges[i + 1] > edges[i]
+    ]
+
+    with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+        parts = list(pool.map(_preprocess_segment, jobs))
+
+    result = _empty_result()
+    for part in parts:
+        for key in result:
+            result[key].extend(part[key])
+
+    result["stats"] = merge_validity_stats([p["stats"] for p in parts])
+    return result
+
+
+def _preprocess_early_abort(
+    video_path: str,
+    keep_frames: bool,
+    face_every_n: int
+) -> Dict:
+    """
+    Serial decode that stops as soon as the quality verdict is final.
+    The evaluator is fed one validity chunk at a time so stats and
+    valid_mask always cover exactly the frames that were decoded.
+    """
+    fps = 25
+    n_out = get_video_info(video_path)["num_output_frames"]
+
+    # One second of slack: container frame counts are only an estimate
+    evaluator = IncrementalQualityEvaluator(
+        expected_frames=n_out + fps if n_out > 0 else None,
+        fps=fps
+    )
+
+    result = _empty_result()
+    result["stats"] = new_validity_stats()
+    pending = []
+    decision = None
+
+    stream = iter_validity(
+        iter_resampled_frames(video_path),
+        result["stats"],
+        face_every_n=face_every_n,
+        with_boxes=True
+    )
+    for frame, t, valid, box in stream:
+        _append_frame(result, frame, t, valid, box, keep_frames)
+        pending.append(valid)
+
+        if len(pending) == VALIDITY_CHUNK_SIZE:
+            decision = evaluator.update(pending)
+            pending = []
+            if decision is not None:
+                stream.close()  # releases the capture
+                break
+
+    if decision is None:
+        evaluator.update(pending)
+        decision = evaluator.finalize()
+
+    result["decision"] = decision
+    return result
+
+
+def preprocess_video(
+    video_path: str,
+    stream: bool = False,
+    num_workers: int = 1,
+    keep_frames: bool = True,
+    face_every_n: int = 1,
+    early_abort: bool = False
+) -> Dict:
+    """
+    Step 2 entry point.
+
+    With stream=True nothing is decoded up front: "frames" is a one-pass
+    iterator of (frame, timestamp, valid, face_box) and "stats" fills in
+    as it is consumed (see run_step3). Call evaluate_video_quality once
+    the stream is exhausted to get the usable / reason verdict.
 
-    decision = evaluate_video_quality(valid_mask, stats)
+    With num_workers > 1 the video is split into that many time segments,
+    each decoded and validated in its own process after seeking to the
+    segment start. Results are stitched back in order and match a serial
+    run. keep_frames=False returns only validity results, which avoids
+    shipping decoded frames back from the workers.
+
+    face_every_n > 1 runs full face detection only every N frames (or on
+    a large frame change) and carries counts forward in between.
+
+    early_abort=True stops decoding once the video is provably unusable
+    (see IncrementalQualityEvaluator); "reason" is the same code a full
+    run would return, and frames / valid_mask cover only what was decoded.
+    Applies to the serial, non-streaming path.
+
+    "face_boxes" holds the relative bounding box of the single face in
+    each frame (None otherwise), for face-ROI cropping in step 3.
+    """
+    if stream:
+        stats = new_validity_stats()
+        return {
+            "frames": iter_validity(
+                iter_resampled_frames(video_path),
+                stats,
+                face_every_n=face_every_n,
+                with_boxes=True
+            ),
+            "stats": stats,
+            "metadata": {
+                "fps": 25,
+                "streaming": True
+            }
+        }
+
+    if num_workers > 1:
+        result = _preprocess_parallel(video_path, num_workers, keep_frames, face_every_n)
+    elif early_abort:
+        result = _preprocess_early_abort(video_path, keep_frames, face_every_n)
+    else:
+        frames, timestamps = load_and_resample_video(video_path)
+
+        result = build_validity_mask_with_stats(frames, face_every_n=face_every_n)
+        result["frames"] = frames if keep_frames else []
+        result["timestamps"] = timestamps
+
+    decision = result.get("decision")
+    if decision is None:
+        decision = evaluate_video_quality(result["valid_mask"], result["stats"])
 
     return {
-        "frames": frames,
-        "timestamps": timestamps,
-        "valid_mask": valid_mask,
+        "frames": result["frames"],
+        "timestamps": result["timestamps"],
+        "valid_mask": result["valid_mask"],
+        "face_boxes": result["face_boxes"],
         "usable": decision["usable"],
         "reason": decision["reason"],
-        "stats": stats,
+        "stats": result["stats"],
         "metadata": {
             "fps": 25,
-            "num_frames": len(frames)
+            "num_frames": len(result["valid_mask"])
         }
     }
 
+
+def _wilson_interval(successes: int, n: int, z: float) -> Tuple[float, float]:
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return float(max(centre - half, 0.0)), float(min(centre + half, 1.0))
+
+
+def probe_video(
+    video_path: str,
+    budget: int = 32,
+    min_valid_frames: int = 100,
+    min_valid_ratio: float = 0.7,
+    z: float = 1.96
+) -> Dict:
+    """
+    Cheap usability estimate before committing to a full step 2 / step 3 run.
+
+    Seeks to `budget` frames spread evenly across the file and applies the
+    face, darkness and blur rules to those only. Returns the estimated
+    valid ratio with a Wilson confidence interval (z=1.96 ~ 95%).
+    "confident" is True when the whole interval lies on one side of
+    min_valid_ratio. The long-gap rule needs contiguous frames and is not
+    estimated here.
+    """
+    fps = 25
+    n_out = get_video_info(video_path, fps)["num_output_frames"]
+
+    indices = []
+    if n_out > 0:
+        n = min(budget, n_out)
+        indices = np.unique(((np.arange(n) + 0.5) * n_out / n).astype(int)).tolist()
+
+    samples = read_frames_at(video_path, indices, fps)
+    frames = [frame for frame, _ in samples]
+
+    stats = new_validity_stats()
+    if frames:
+        with open_graph("face_detection", create_face_detector) as detector:
+            face_counts = [count_faces(detector, frame) for frame in frames]
+        validate_frame_batch(frames, face_counts, stats)
+        stats["face_detector_calls"] = len(frames)
+
+    sampled = stats["total_frames"]
+    low, high = _wilson_interval(stats["valid_frames"], sampled, z)
+    valid_ratio = stats["valid_frames"] / sampled if sampled else 0.0
+
+    if sampled == 0:
+        decision = {"usable": False, "reason": "NO_FRAMES_DECODED"}
+    elif valid_ratio * n_out < min_valid_frames:
+        decision = {"usable": False, "reason": "TOO_FEW_VALID_FRAMES"}
+    elif valid_ratio < min_valid_ratio:
+        decision = {"usable": False, "reason": "LOW_VALID_RATIO"}
+    else:
+        decision = {"usable": True, "reason": "OK"}
+
+    return {
+        "usable": decision["usable"],
+        "reason": decision["reason"],
+        "valid_ratio": valid_ratio,
+        "valid_ratio_ci": (low, high),
+        "confident": low >= min_valid_ratio or high < min_valid_ratio,
+        "stats": stats,
+        "metadata": {
+            "fps": fps,
+            "num_frames_estimate": n_out,
+            "sampled_frames": sampled
+        }
+    }
@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+from typing import Dict, Sequence, Tuple
 
 def is_frame_too_dark(frame: np.ndarray, threshold: float = 40) -> bool:
     gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
@@ -18,3 +19,63 @@ def is_frame_blurry(frame: np.ndarray, threshold: float = 30) -> bool:
     # Debug tip: print(lap_var) once to see values
     return lap_var < threshold
 
+
+def frames_to_luma(frames: Sequence[np.ndarray], scale: float = 0.5) -> np.ndarray:
+    """
+    Downscales then converts each RGB frame to grayscale once.
+    Returns a (N, h, w) uint8 stack. All frames must share a size.
+    """
+    if len(frames) == 0:
+        return np.zeros((0, 0, 0), dtype=np.uint8)
+
+    h, w = frames[0].shape[:2]
+    size = (max(int(w * scale), 1), max(int(h * scale), 1))
+
+    luma = np.empty((len(frames), size[1], size[0]), dtype=np.uint8)
+    for i, frame in enumerate(frames):
+        small = frame if scale == 1 else cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        luma[i] = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+    return luma
+
+
+def luma_brightness_and_sharpness(luma: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean brightness and Laplacian variance for a whole (N, h, w) stack.
+    The Laplacian is the same 4-neighbour kernel cv2.Laplacian uses with
+    ksize=1, with reflect-101 borders, evaluated for all frames at once.
+    """
+    x = luma.astype(np.float32)
+    brightness = x.mean(axis=(1, 2))
+
+    p = np.pad(x, ((0, 0), (1, 1), (1, 1)), mode="reflect")
+    lap = (
+        p[:, :-2, 1:-1] + p[:, 2:, 1:-1]
+        + p[:, 1:-1, :-2] + p[:, 1:-1, 2:]
+        - 4 * x
+    )
+
+    return brightness, lap.var(axis=(1, 2))
+
+
+def check_frame_quality_batch(
+    frames: Sequence[np.ndarray],
+    dark_threshold: float = 40,
+    blur_threshold: float = 30,
+    scale: float = 0.5
+) -> Dict[str, np.ndarray]:
+    """
+    Batch version of is_frame_too_dark / is_frame_blurry.
+    One grayscale conversion per frame, on a downscaled copy, shared by
+    both rules. Note the blur threshold is applied to the Laplacian of
+    the downscaled luma; pass scale=1 for full-resolution behaviour.
+    """
+    luma = frames_to_luma(frames, scale)
+    brightness, lap_var = luma_brightness_and_sharpness(luma)
+
+    return {
+        "brightness": brightness,
+        "laplacian_var": lap_var,
+        "too_dark": brightness < dark_threshold,
+        "blurry": lap_var < blur_threshold,
+    }
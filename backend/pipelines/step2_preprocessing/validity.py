@@ -1,79 +1,206 @@
-from typing import List, Dict
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 import numpy as np
 
-from .face_filter import detect_faces
-from .quality_checks import is_frame_too_dark, is_frame_blurry
+from pipelines.graph_pool import open_graph
+from .face_filter import FaceCountTracker, create_face_detector
+from .quality_checks import check_frame_quality_batch
 
 
-def build_validity_mask_with_stats(frames: List[np.ndarray]) -> Dict:
-    face_counts = detect_faces(frames)
+# Frames validated together; stats are always updated a whole chunk at a time
+VALIDITY_CHUNK_SIZE = 32
 
-    valid_mask = []
 
-    stats = {
-        "total_frames": len(frames),
+def new_validity_stats() -> Dict:
+    return {
+        "total_frames": 0,
         "valid_frames": 0,
         "no_face_frames": 0,
         "multi_face_frames": 0,
         "dark_frames": 0,
         "blurry_frames": 0,
+        "face_detector_calls": 0,
+        "face_detector_calls_saved": 0,
+    }
+
+
+def merge_validity_stats(parts: List[Dict]) -> Dict:
+    """Sums per-segment stats dicts into one, in the same shape."""
+    merged = new_validity_stats()
+    for part in parts:
+        for k in merged:
+            merged[k] += part[k]
+    return merged
+
+
+def validate_frame_batch(
+    frames: Sequence[np.ndarray],
+    face_counts: Sequence[int],
+    stats: Optional[Dict] = None
+) -> Dict:
+    """
+    Applies the face, lighting and blur rules to a chunk of frames at once.
+    Returns per-frame arrays plus the stats dict (updated in place when
+    one is passed, so chunks can accumulate into a running total).
+    """
+    if stats is None:
+        stats = new_validity_stats()
+
+    n_faces = np.asarray(face_counts, dtype=np.int32)
+    quality = check_frame_quality_batch(frames)
+
+    # Face rules
+    no_face = n_faces == 0
+    multi_face = n_faces > 1
+
+    # Lighting rule
+    dark = quality["too_dark"]
+
+    # Blur rule (secondary)
+    blurry = quality["blurry"] & (n_faces != 1)
+
+    valid = ~(no_face | multi_face | dark | blurry)
+
+    stats["total_frames"] += len(n_faces)
+    stats["valid_frames"] += int(valid.sum())
+    stats["no_face_frames"] += int(no_face.sum())
+    stats["multi_face_frames"] += int(multi_face.sum())
+    stats["dark_frames"] += int(dark.sum())
+    stats["blurry_frames"] += int(blurry.sum())
+
+    return {
+        "valid": valid,
+        "face_counts": n_faces,
+        "brightness": quality["brightness"],
+        "laplacian_var": quality["laplacian_var"],
+        "stats": stats
     }
 
-    for frame, n_faces in zip(frames, face_counts):
-        valid = True  # RESET every frame
 
-        # Face rules
-        if n_faces == 0:
-            stats["no_face_frames"] += 1
-            valid = False
-        elif n_faces > 1:
-            stats["multi_face_frames"] += 1
-            valid = False
+def count_faces_tracked(
+    tracker: FaceCountTracker,
+    frames: Sequence[np.ndarray],
+    stats: Dict,
+    face_boxes: Optional[List] = None
+) -> List[int]:
+    """
+    Face counts for a chunk, recording detector calls made / saved in stats.
+    When `face_boxes` is given, the single-face box (or None) of every
+    frame is appended to it.
+    """
+    calls_before = tracker.detector_calls
+    face_counts = []
+    for frame in frames:
+        face_counts.append(tracker.count(frame))
+        if face_boxes is not None:
+            face_boxes.append(tracker.box)
 
-        # Lighting rule
-        if is_frame_too_dark(frame):
-            stats["dark_frames"] += 1
-            valid = False
+    calls = tracker.detector_calls - calls_before
+    stats["face_detector_calls"] += calls
+    stats["face_detector_calls_saved"] += len(frames) - calls
 
-        # Blur rule (secondary)
-        if is_frame_blurry(frame) and n_faces != 1:
-            stats["blurry_frames"] += 1
-            valid = False
+    return face_counts
 
-        if valid:
-            stats["valid_frames"] += 1
 
+def iter_validity(
+    frame_stream: Iterable[Tuple[np.ndarray, Optional[float]]],
+    stats: Dict,
+    chunk_size: int = VALIDITY_CHUNK_SIZE,
+    face_every_n: int = 1,
+    with_boxes: bool = False
+) -> Iterator[Tuple]:
+    """
+    Single-pass validity check over a (frame, timestamp) stream.
+    Yields (frame, timestamp, valid) and updates `stats` in place.
+    Frames are checked in chunks of `chunk_size`, so at most one chunk
+    is held in memory regardless of video length.
+
+    face_every_n > 1 runs face detection sparsely (see FaceCountTracker);
+    the saved detector calls are reported in stats.
+
+    with_boxes=True yields (frame, timestamp, valid, face_box) instead,
+    where face_box is the single face's relative bounding box or None.
+    """
+    frame_stream = iter(frame_stream)
+
+    with open_graph("face_detection", create_face_detector) as detector:
+        tracker = FaceCountTracker(detector, every_n=face_every_n)
+
+        while True:
+            chunk = list(islice(frame_stream, chunk_size))
+            if not chunk:
+                break
+
+            frames = [frame for frame, _ in chunk]
+            boxes = []
+            face_counts = count_faces_tracked(tracker, frames, stats, boxes)
+            batch = validate_frame_batch(frames, face_counts, stats)
+
+            for (frame, t), valid, box in zip(chunk, batch["valid"], boxes):
+                if with_boxes:
+                    yield frame, t, bool(valid), box
+                else:
+                    yield frame, t, bool(valid)
+
+
+def build_validity_mask_with_stats(
+    frames: Iterable[np.ndarray],
+    face_every_n: int = 1
+) -> Dict:
+    stats = new_validity_stats()
+
+    frame_stream = ((f, None) for f in frames)
+    valid_mask, face_boxes = [], []
+    for _, _, valid, box in iter_validity(
+        frame_stream, stats, face_every_n=face_every_n, with_boxes=True
+    ):
         valid_mask.append(valid)
-        
+        face_boxes.append(box)
 
     return {
         "valid_mask": valid_mask,
+        "face_boxes": face_boxes,
         "stats": stats
     }
 
 
-def evaluate_video_quality(
-    valid_mask: List[bool],
-    stats: Dict,
-    min_valid_frames: int = 100,
-    min_valid_ratio: float = 0.7,
-    max_invalid_gap_sec: float = 3.0,
-    fps: int = 25
+def _invalid_runs(valid_mask: Sequence[bool]) -> Tuple[np.ndarray, np.ndarray]:
+    """Start index and length of every run of invalid frames."""
+    invalid = ~np.asarray(valid_mask, dtype=bool)
+    padded = np.concatenate(([False], invalid, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    starts, ends = edges[::2], edges[1::2]
+    return starts, ends - starts
+
+
+def longest_invalid_run(valid_mask: Sequence[bool]) -> int:
+    _, lengths = _invalid_runs(valid_mask)
+    return int(lengths.max()) if lengths.size else 0
+
+
+def _quality_verdict(
+    total_frames: int,
+    valid_frames: int,
+    max_gap: int,
+    min_valid_frames: int,
+    min_valid_ratio: float,
+    max_invalid_gap_sec: float,
+    fps: int
 ) -> Dict:
 
     # Guard: no frames at all
-    if stats["total_frames"] == 0:
+    if total_frames == 0:
         return {"usable": False, "reason": "NO_FRAMES_DECODED"}
 
     # Rule 1: too few valid frames (YOUR REQUEST)
-    if stats["valid_frames"] < min_valid_frames:
+    if valid_frames < min_valid_frames:
         return {
             "usable": False,
             "reason": "TOO_FEW_VALID_FRAMES",
         }
 
     # Rule 2: valid ratio
-    valid_ratio = stats["valid_frames"] / stats["total_frames"]
+    valid_ratio = valid_frames / total_frames
     if valid_ratio < min_valid_ratio:
         return {
             "usable": False,
@@ -81,15 +208,6 @@ def evaluate_video_quality(
         }
 
     # Rule 3: long continuous invalid gap
-    max_gap = 0
-    current_gap = 0
-    for v in valid_mask:
-        if not v:
-            current_gap += 1
-            max_gap = max(max_gap, current_gap)
-        else:
-            current_gap = 0
-
     if max_gap / fps > max_invalid_gap_sec:
         return {
             "usable": False,
@@ -98,3 +216,126 @@ def evaluate_video_quality(
 
     return {"usable": True, "reason": "OK"}
 
+
+def evaluate_video_quality(
+    valid_mask: List[bool],
+    stats: Dict,
+    min_valid_frames: int = 100,
+    min_valid_ratio: float = 0.7,
+    max_invalid_gap_sec: float = 3.0,
+    fps: int = 25
+) -> Dict:
+    return _quality_verdict(
+        stats["total_frames"],
+        stats["valid_frames"],
+        longest_invalid_run(valid_mask),
+        min_valid_frames,
+        min_valid_ratio,
+        max_invalid_gap_sec,
+        fps
+    )
+
+
+class IncrementalQualityEvaluator:
+    """
+    Streaming counterpart of evaluate_video_quality.
+
+    Feed validity flags chunk by chunk with update(). It returns the final
+    verdict as soon as no remaining frames could change it, otherwise None.
+    Call finalize() once the stream ends.
+
+    expected_frames is an upper bound on the total frame count (e.g. the
+    container estimate plus some slack); without it only the gap rule
+    can end a video early. With exact_reason=True (default) the reason is
+    guaranteed to match a full evaluate_video_quality run, which means a
+    long gap only aborts once rules 1 and 2 are known to pass. With
+    exact_reason=False the first rule proven to fail ends the video.
+    """
+
+    def __init__(
+        self,
+        expected_frames: Optional[int] = None,
+        min_valid_frames: int = 100,
+        min_valid_ratio: float = 0.7,
+        max_invalid_gap_sec: float = 3.0,
+        fps: int = 25,
+        exact_reason: bool = True
+    ):
+        self.expected_frames = expected_frames
+        self.min_valid_frames = min_valid_frames
+        self.min_valid_ratio = min_valid_ratio
+        self.max_invalid_gap_sec = max_invalid_gap_sec
+        self.fps = fps
+        self.exact_reason = exact_reason
+
+        self.total_frames = 0
+        self.valid_frames = 0
+        self.max_gap = 0
+        self.current_gap = 0
+
+    def _scan(self, valid: np.ndarray):
+        starts, lengths = _invalid_runs(valid)
+        if lengths.size == 0:
+            self.current_gap = 0
+            return
+
+        touches_end = starts[-1] + lengths[-1] == len(valid)
+
+        # A run touching the chunk start continues the previous trailing gap
+        if starts[0] == 0:
+            lengths = lengths.copy()
+            lengths[0] += self.current_gap
+
+        self.max_gap = max(self.max_gap, int(lengths.max()))
+        self.current_gap = int(lengths[-1]) if touches_end else 0
+
+    def update(self, valid_chunk: Sequence[bool]) -> Optional[Dict]:
+        valid = np.asarray(valid_chunk, dtype=bool)
+        if valid.size == 0:
+            return None
+
+        self.total_frames += int(valid.size)
+        self.valid_frames += int(valid.sum())
+        self._scan(valid)
+
+        return self._early_verdict()
+
+    def _early_verdict(self) -> Optional[Dict]:
+        gap_failed = self.max_gap / self.fps > self.max_invalid_gap_sec
+
+        if self.expected_frames is None:
+            if gap_failed and not self.exact_reason:
+                return {"usable": False, "reason": "LONG_INVALID_GAP"}
+            return None
+
+        expected = max(self.expected_frames, self.total_frames)
+        remaining = expected - self.total_frames
+
+        # Rule 1 provably fails even if every remaining frame is valid
+        best_valid = self.valid_frames + remaining
+        if best_valid < self.min_valid_frames:
+            return {"usable": False, "reason": "TOO_FEW_VALID_FRAMES"}
+        rule1_passes = self.valid_frames >= self.min_valid_frames
+
+        # Rule 2 provably fails / passes whatever the remaining frames are
+        best_ratio = best_valid / expected
+        worst_ratio = self.valid_frames / expected
+        if best_ratio < self.min_valid_ratio and (rule1_passes or not self.exact_reason):
+            return {"usable": False, "reason": "LOW_VALID_RATIO"}
+        rule2_passes = worst_ratio >= self.min_valid_ratio
+
+        if gap_failed and ((rule1_passes and rule2_passes) or not self.exact_reason):
+            return {"usable": False, "reason": "LONG_INVALID_GAP"}
+
+        return None
+
+    def finalize(self) -> Dict:
+        return _quality_verdict(
+            self.total_frames,
+            self.valid_frames,
+            self.max_gap,
+            self.min_valid_frames,
+            self.min_valid_ratio,
+            self.max_invalid_gap_sec,
+            self.fps
+        )
@@ -1,41 +1,177 @@
 import cv2
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
-def load_and_resample_video(
-    video_path: str,
-    target_fps: int = 25,
-    max_width: int = 720
-) -> Tuple[List[np.ndarray], List[float]]:
 
+def _open_video(video_path: str) -> cv2.VideoCapture:
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise ValueError("Could not open video")
+    return cap
 
-    orig_fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_interval = int(round(orig_fps / target_fps))
 
-    frames = []
-    timestamps = []
+def iter_resampled_frames(
+    video_path: str,
+    target_fps: int = 25,
+    max_width: int = 720,
+    start: int = 0,
+    stop: Optional[int] = None
+) -> Iterator[Tuple[np.ndarray, float]]:
+    """
+    Streaming variant of load_and_resample_video.
+    Yields (frame, timestamp) one at a time so only the current frame
+    is held in memory. The video is opened eagerly, so a bad path
+    raises here rather than on first iteration.
 
-    frame_idx = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    start / stop select a range of *output* frames, which lets segment
+    workers seek straight to their part of the file. Timestamps are
+    identical to the ones a full serial pass would produce.
+    """
+    cap = _open_video(video_path)
+    return _resample(cap, target_fps, max_width, start, stop)
 
-        if frame_idx % frame_interval == 0:
-            h, w = frame.shape[:2]
-            if w > max_width:
-                scale = max_width / w
-                frame = cv2.resize(frame, (int(w * scale), int(h * scale)))
 
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frames.append(frame)
-            timestamps.append(frame_idx / orig_fps)
+def get_video_info(video_path: str, target_fps: int = 25) -> Dict:
+    """
+    Container metadata plus the number of frames load_and_resample_video
+    would emit. Frame counts come from the container header and can be
+    slightly off for some codecs; treat them as an estimate.
+    """
+    cap = _open_video(video_path)
+    try:
+        orig_fps = _source_fps(cap, target_fps)
+        frame_count = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+    finally:
+        cap.release()
 
-        frame_idx += 1
+    num_output_frames = 0
+    if frame_count > 0:
+        num_output_frames = int(np.ceil((frame_count - 0.5) * target_fps / orig_fps))
 
-    cap.release()
-    return frames, timestamps
+    return {
+        "fps": orig_fps,
+        "frame_count": frame_count,
+        "num_output_frames": num_output_frames,
+    }
+
+
+def _source_fps(cap: cv2.VideoCapture, target_fps: int) -> float:
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    # Some containers report 0 or NaN; fall back to "already at target rate"
+    if not fps or fps != fps or fps <= 0:
+        return float(target_fps)
+    return fps
+
+
+def source_frame_index(out_idx: int, orig_fps: float, target_fps: int) -> int:
+    """
+    Index of the source frame nearest to output timestamp out_idx / target_fps.
+    Valid for any ratio, including non-integer (29.97 -> 25) and
+    upsampling (15 -> 25, where source frames repeat).
+    """
+    return int(np.floor(out_idx * orig_fps / target_fps + 0.5))
+
+
+def _prepare_frame(frame: np.ndarray, max_width: int) -> np.ndarray:
+    h, w = frame.shape[:2]
+    if w > max_width:
+        scale = max_width / w
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)))
+
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def _resample(
+    cap: cv2.VideoCapture,
+    target_fps: int,
+    max_width: int,
+    start: int = 0,
+    stop: Optional[int] = None
+) -> Iterator[Tuple[np.ndarray, float]]:
+    """
+    Picks source frames by target timestamp. Frames that are not needed
+    are only grab()-ed, never retrieve()-d, so colour conversion and
+    resizing scale with the output frame count, not the source one.
+    Timestamps are the output grid k / target_fps.
+    """
+    orig_fps = _source_fps(cap, target_fps)
+
+    try:
+        out_idx = start
+        src_idx = 0
+        if start > 0:
+            src_idx = source_frame_index(start, orig_fps, target_fps)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, src_idx)
+
+        while stop is None or out_idx < stop:
+            wanted = source_frame_index(out_idx, orig_fps, target_fps)
+
+            # Skip frames between the previous pick and the next one
+            while src_idx < wanted:
+                if not cap.grab():
+                    return
+                src_idx += 1
+
+            if not cap.grab():
+                break
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
 
+            frame = _prepare_frame(frame, max_width)
+
+            # Upsampling: one source frame can cover several output slots
+            while (
+                (stop is None or out_idx < stop)
+                and source_frame_index(out_idx, orig_fps, target_fps) == src_idx
+            ):
+                yield frame, out_idx / target_fps
+                out_idx += 1
+
+            src_idx += 1
+    finally:
+        cap.release()
+
+
+def read_frames_at(
+    video_path: str,
+    out_indices: Sequence[int],
+    target_fps: int = 25,
+    max_width: int = 720
+) -> List[Tuple[np.ndarray, float]]:
+    """
+    Random access into the resampled timeline: seeks to each requested
+    output frame and decodes just that one. Frames past the real end of
+    the file are silently dropped.
+    """
+    cap = _open_video(video_path)
+    orig_fps = _source_fps(cap, target_fps)
+
+    samples = []
+    try:
+        for out_idx in out_indices:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, source_frame_index(out_idx, orig_fps, target_fps))
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            samples.append((_prepare_frame(frame, max_width), out_idx / target_fps))
+    finally:
+        cap.release()
+
+    return samples
+
+
+def load_and_resample_video(
+    video_path: str,
+    target_fps: int = 25,
+    max_width: int = 720
+) -> Tuple[List[np.ndarray], List[float]]:
+
+    frames = []
+    timestamps = []
+
+    for frame, t in iter_resampled_frames(video_path, target_fps, max_width):
+        frames.append(frame)
+        timestamps.append(t)
+
+    return frames, timestamps
@@ -1,9 +1,47 @@
 import json
 import numpy as np
 
-def load_dream_sequence(json_path):
+from .sequence import PoseGazeSequence
+
+# Step 3 joint name -> DREAM skeleton key (shoulders resolved per file)
+DREAM_JOINTS = [
+    ("left_wrist", "wrist_left"),
+    ("right_wrist", "wrist_right"),
+    ("left_elbow", "elbow_left"),
+    ("right_elbow", "elbow_right"),
+    ("left_shoulder", "shoulder_left"),
+    ("right_shoulder", "shoulder_right"),
+]
+
+
+def _column(source, key, n_frames):
     """
-    Convert DREAM 1.2 JSON into Step-3-compatible sequence.
+    One DREAM stream as a float64 array of length n_frames.
+    JSON nulls, non-list streams and short streams become NaN;
+    long streams are truncated.
+    """
+    out = np.full(n_frames, np.nan)
+
+    arr = source.get(key, []) if isinstance(source, dict) else []
+    if not isinstance(arr, list):
+        return out
+
+    arr = arr[:n_frames]
+    try:
+        out[:len(arr)] = np.array(arr, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Mixed content (e.g. numeric strings next to nulls): element-wise
+        out[:len(arr)] = [np.nan if v is None else float(v) for v in arr]
+
+    return out
+
+
+def load_dream_arrays(json_path):
+    """
+    Vectorized DREAM 1.2 JSON -> columnar PoseGazeSequence.
+    Every stream is converted in one step; missing values stay NaN and
+    per-frame validity comes from the NaN masks of the six skeleton x
+    streams. Returns None if the file cannot be used.
     Robust to:
     - mismatched stream lengths
     - JSON nulls
@@ -15,10 +53,10 @@ def load_dream_sequence(json_path):
             data = json.load(f)
     except json.JSONDecodeError:
         print(f"[SKIP] Corrupted JSON: {json_path}")
-        return []
+        return None
     except Exception as e:
         print(f"[SKIP] Failed to load {json_path}: {e}")
-        return []
+        return None
 
     skeleton = data.get("skeleton", {})
     eye = data.get("eye_gaze", {})
@@ -38,86 +76,61 @@ def load_dream_sequence(json_path):
 
     if n_frames == 0:
         print(f"[WARN] No valid frames in {json_path}")
-        return []
+        return None
 
     # ---------- 2. Resolve shoulder typo ----------
     if "shoulder_left" in skeleton:
-        ls_key, rs_key = "shoulder_left", "shoulder_right"
+        shoulder = {"shoulder_left": "shoulder_left", "shoulder_right": "shoulder_right"}
     else:
-        ls_key, rs_key = "sholder_left", "sholder_right"
-
-    # ---------- 3. Universal safe getter ----------
-    def get_val(source, key, idx, default=0.0):
-        arr = source.get(key, [])
-        if not isinstance(arr, list) or idx >= len(arr):
-            return default, False
-        val = arr[idx]
-        if val is None:
-            return default, False
-        return float(val), True
-
-    seq = []
-
-    for i in range(n_frames):
-        frame_valid = True
-
-        # ---- Skeleton ----
-        wlx, v1 = get_val(skeleton.get("wrist_left", {}), "x", i)
-        wly, _  = get_val(skeleton.get("wrist_left", {}), "y", i)
-        wlz, _  = get_val(skeleton.get("wrist_left", {}), "z", i)
-
-        wrx, v2 = get_val(skeleton.get("wrist_right", {}), "x", i)
-        wry, _  = get_val(skeleton.get("wrist_right", {}), "y", i)
-        wrz, _  = get_val(skeleton.get("wrist_right", {}), "z", i)
-
-        elx, v3 = get_val(skeleton.get("elbow_left", {}), "x", i)
-        ely, _  = get_val(skeleton.get("elbow_left", {}), "y", i)
-        elz, _  = get_val(skeleton.get("elbow_left", {}), "z", i)
-
-        erx, v4 = get_val(skeleton.get("elbow_right", {}), "x", i)
-        ery, _  = get_val(skeleton.get("elbow_right", {}), "y", i)
-        erz, _  = get_val(skeleton.get("elbow_right", {}), "z", i)
-
-        slx, v5 = get_val(skeleton.get(ls_key, {}), "x", i)
-        sly, _  = get_val(skeleton.get(ls_key, {}), "y", i)
-        slz, _  = get_val(skeleton.get(ls_key, {}), "z", i)
-
-        srx, v6 = get_val(skeleton.get(rs_key, {}), "x", i)
-        sry, _  = get_val(skeleton.get(rs_key, {}), "y", i)
-        srz, _  = get_val(skeleton.get(rs_key, {}), "z", i)
-
-        if not all([v1, v2, v3, v4, v5, v6]):
-            frame_valid = False
-
-        pose = {
-            "left_wrist": np.array([wlx, wly, wlz], dtype=np.float32),
-            "right_wrist": np.array([wrx, wry, wrz], dtype=np.float32),
-            "left_elbow": np.array([elx, ely, elz], dtype=np.float32),
-            "right_elbow": np.array([erx, ery, erz], dtype=np.float32),
-            "left_shoulder": np.array([slx, sly, slz], dtype=np.float32),
-            "right_shoulder": np.array([srx, sry, srz], dtype=np.float32),
-        }
-
-        # ---- Head ----
-        hy, vh1 = get_val(head, "ry", i)
-        hp, vh2 = get_val(head, "rx", i)
-        hr, vh3 = get_val(head, "rz", i)
-
-        head_pose = {"yaw": hy, "pitch": hp, "roll": hr}
-
-        # ---- Gaze ----
-        gx, vg1 = get_val(eye, "rx", i)
-        gy, vg2 = get_val(eye, "ry", i)
-
-        gaze = {"gx": gx, "gy": gy, "gz": 1.0}
-
-        seq.append({
-            "t": i / frame_rate,
-            "pose": pose,
-            "head": head_pose,
-            "gaze": gaze,
-            "valid": frame_valid
-        })
+        shoulder = {"shoulder_left": "sholder_left", "shoulder_right": "sholder_right"}
+
+    # ---------- 3. Skeleton: (T, 6, 3) in one pass per stream ----------
+    pose = np.empty((n_frames, len(DREAM_JOINTS), 3), dtype=np.float32)
+    for j, (_, key) in enumerate(DREAM_JOINTS):
+        joint = skeleton.get(shoulder.get(key, key), {})
+        for c, axis in enumerate("xyz"):
+            pose[:, j, c] = _column(joint, axis, n_frames)
+
+    # A frame is valid when every joint has its x coordinate
+    valid = ~np.isnan(pose[:, :, 0]).any(axis=1)
+
+    # ---------- 4. Head / gaze ----------
+    head_arr = np.stack([
+        _column(head, "ry", n_frames),   # yaw
+        _column(head, "rx", n_frames),   # pitch
+        _column(head, "rz", n_frames),   # roll
+    ], axis=1)
+
+    gaze_arr = np.stack([
+        _column(eye, "rx", n_frames),
+        _column(eye, "ry", n_frames),
+        np.ones(n_frames),
+    ], axis=1)
+
+    return PoseGazeSequence(
+        t=np.arange(n_frames) / frame_rate,
+        valid=valid,
+        pose=pose,
+        head=head_arr,
+        gaze=gaze_arr,
+        joints=[name for name, _ in DREAM_JOINTS],
+        fps=float(frame_rate)
+    )
 
-    return seq
 
+def load_dream_sequence(json_path):
+    """
+    Convert DREAM 1.2 JSON into Step-3-compatible sequence.
+    Same output as before (missing values read as 0.0, validity from the
+    skeleton streams), now backed by load_dream_arrays. Iterating or
+    indexing the result gives the per-frame dicts.
+    """
+    seq = load_dream_arrays(json_path)
+    if seq is None:
+        return []
+
+    for name in ("pose", "head", "gaze"):
+        arr = getattr(seq, name)
+        arr[np.isnan(arr)] = 0.0
+
+    return seq
@@ -1,28 +1,152 @@
-from .pose_extractor import extract_pose_sequence
-from .face_mesh import extract_head_pose_sequence
-from .gaze_estimator import estimate_gaze_sequence
+from functools import partial
+
+import numpy as np
+
+from pipelines.graph_pool import open_graph
+
+from .pose_extractor import create_pose_model, estimate_pose
+from .face_mesh import create_face_mesh_model, estimate_head_pose, open_roi_graph
+from .gaze_estimator import estimate_gaze
+from .keyframes import KeyframeSelector, interpolate_skipped, select_keyframes
+from .parallel import run_segmented
+from .sequence import SequenceBuilder
+
+
+def estimate_frame(
+    pose_model, face_model, frame, t, valid, face_box=None, pose_width=None, roi_model=None
+):
+    """
+    Pose, head and gaze for one frame, in the step 3 sequence format.
+    face_box crops the face mesh input to the face and runs it through
+    roi_model (see estimate_head_pose); pose_width runs the pose graph
+    on a downscaled frame.
+    """
+    pose = estimate_pose(pose_model, frame, pose_width) if valid else None
+    head = estimate_head_pose(face_model, frame, face_box, roi_model=roi_model) if valid else None
+
+    return {
+        "t": t,
+        "pose": pose,
+        "head": head,
+        "gaze": estimate_gaze(head),
+        "valid": valid
+    }
+
+
+def estimate_sequence(frames, valid_mask, face_boxes=None, pose_width=None):
+    """
+    estimate_frame over a list of frames with one pose and one face mesh
+    graph, so run_segmented sends each segment's frames to the pool once.
+    The "t" of every entry is None; callers fill in timestamps.
+    """
+    if face_boxes is None:
+        face_boxes = [None] * len(frames)
+
+    out = []
+    with open_graph("pose", create_pose_model) as pose_model, \
+            open_graph("face_mesh", create_face_mesh_model) as face_model, \
+            open_roi_graph(any(box is not None for box in face_boxes)) as roi_model:
+        for frame, valid, box in zip(frames, valid_mask, face_boxes):
+            out.append(estimate_frame(
+                pose_model, face_model, frame, None, valid,
+                face_box=box, pose_width=pose_width, roi_model=roi_model
+            ))
+
+    return out
+
+
+def _run_step3_stream(frame_stream, face_roi=False, pose_width=None, selector=None):
+    """
+    One pass over a (frame, timestamp, valid, face_box) stream from
+    preprocess_video(..., stream=True). Each frame is dropped as soon
+    as its landmarks are extracted.
+    """
+    builder = SequenceBuilder()
+    keyframe = []
+
+    with open_graph("pose", create_pose_model) as pose_model, \
+            open_graph("face_mesh", create_face_mesh_model) as face_model, \
+            open_roi_graph(face_roi) as roi_model:
+        for frame, t, valid, box in frame_stream:
+            key = selector.is_keyframe(frame, valid) if selector is not None else valid
+            keyframe.append(key)
+
+            out = estimate_frame(
+                pose_model, face_model, frame, t, key,
+                face_box=box if face_roi else None,
+                pose_width=pose_width,
+                roi_model=roi_model
+            )
+            out["valid"] = valid
+            builder.append(out)
+
+    sequence = builder.build()
+    if selector is not None:
+        sequence.keyframe = np.asarray(keyframe, dtype=bool)
+        interpolate_skipped(sequence, sequence.keyframe)
+    return sequence
+
+
+def run_step3(
+    step2_output,
+    num_workers=1,
+    warmup_frames=25,
+    face_roi=False,
+    pose_width=None,
+    adaptive=False,
+    motion_threshold=3.0,
+    max_skip=4
+):
+    """
+    num_workers > 1 splits the frames into segments processed in a
+    process pool, each with `warmup_frames` of overlap so tracking can
+    stabilise (see run_segmented). Not available for streamed input.
+
+    face_roi=True runs face mesh on a crop around the face box found in
+    step 2 instead of the full frame (frames without a single face box
+    fall back to the full frame). pose_width downscales frames for the
+    pose graph, e.g. 256 or 320 pixels wide.
+
+    adaptive=True runs the landmark models only on keyframes: frames
+    whose downscaled luma changed by more than `motion_threshold` since
+    the last keyframe, or after `max_skip` skipped frames (see
+    KeyframeSelector). Skipped frames are interpolated and the result's
+    `skip_ratio` reports the share of valid frames that were skipped.
+
+    Returns a columnar PoseGazeSequence; iterating or indexing it yields
+    the usual per-frame dicts.
+    """
+    if step2_output.get("metadata", {}).get("streaming"):
+        selector = KeyframeSelector(motion_threshold, max_skip) if adaptive else None
+        return _run_step3_stream(step2_output["frames"], face_roi, pose_width, selector)
 
-def run_step3(step2_output):
     frames = step2_output["frames"]
     valid_mask = step2_output["valid_mask"]
     timestamps = step2_output["timestamps"]
 
-    pose_seq = extract_pose_sequence(frames, valid_mask)
-    head_seq = extract_head_pose_sequence(frames, valid_mask)
-    gaze_seq = estimate_gaze_sequence(head_seq)
+    keyframe = None
+    run_mask = valid_mask
+    if adaptive:
+        keyframe = select_keyframes(frames, valid_mask, motion_threshold, max_skip)
+        run_mask = keyframe.tolist()
 
-    sequence = []
+    face_boxes = step2_output.get("face_boxes") if face_roi else None
 
-    for t, pose, head, gaze, valid in zip(
-        timestamps, pose_seq, head_seq, gaze_seq, valid_mask
-    ):
-        sequence.append({
-            "t": t,
-            "pose": pose,
-            "head": head,
-            "gaze": gaze,
-            "valid": valid
-        })
+    estimates = run_segmented(
+        partial(estimate_sequence, pose_width=pose_width),
+        frames, run_mask, num_workers, warmup_frames,
+        extras=(face_boxes,) if face_boxes is not None else ()
+    )
 
-    return sequence
+    builder = SequenceBuilder()
+
+    for t, out, valid in zip(timestamps, estimates, valid_mask):
+        out["t"] = t
+        out["valid"] = valid
+        builder.append(out)
 
+    sequence = builder.build()
+    if keyframe is not None:
+        sequence.keyframe = keyframe
+        interpolate_skipped(sequence, keyframe)
+    return sequence
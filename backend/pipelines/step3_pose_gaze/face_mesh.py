@@ -1,38 +1,124 @@
+from contextlib import nullcontext
+
 import mediapipe as mp
 import numpy as np
 
+from pipelines.graph_pool import open_graph
+
 mp_face = mp.solutions.face_mesh
 
-def extract_head_pose_sequence(frames, valid_mask):
-    head_seq = []
 
-    with mp_face.FaceMesh(static_image_mode=False) as face_model:
-        for frame, valid in zip(frames, valid_mask):
-            if not valid:
-                head_seq.append(None)
-                continue
+def create_face_mesh_model():
+    return mp_face.FaceMesh(static_image_mode=False)
 
-            result = face_model.process(frame)
-            if not result.multi_face_landmarks:
-                head_seq.append(None)
-                continue
 
-            lm = result.multi_face_landmarks[0].landmark
+def create_face_roi_model():
+    # The crop window moves every frame, so landmarks tracked on one crop
+    # would be in the wrong coordinates for the next: detect per image
+    return mp_face.FaceMesh(static_image_mode=True)
 
-            # Simple proxy angles (sufficient for behavior)
-            left_eye = np.array([lm[33].x, lm[33].y])
-            right_eye = np.array([lm[263].x, lm[263].y])
-            nose = np.array([lm[1].x, lm[1].y])
 
-            yaw = right_eye[0] - left_eye[0]
-            pitch = nose[1] - (left_eye[1] + right_eye[1]) / 2
-            roll = right_eye[1] - left_eye[1]
+def open_roi_graph(face_roi=True):
+    """Static-image face mesh graph for ROI crops; yields None when face_roi is off."""
+    if not face_roi:
+        return nullcontext()
+    return open_graph("face_mesh_roi", create_face_roi_model)
 
-            head_seq.append({
-                "yaw": float(yaw),
-                "pitch": float(pitch),
-                "roll": float(roll)
-            })
 
-    return head_seq
+def face_roi(frame, face_box, pad=0.5):
+    """
+    Square crop around a step 2 face box (relative xmin, ymin, w, h),
+    grown by `pad` of the box size on every side and clipped to the frame.
+    Returns (crop, (x0, y0, width, height)) in pixels, or None when the
+    box is missing or degenerate.
+    """
+    if face_box is None:
+        return None
+
+    H, W = frame.shape[:2]
+    bx, by, bw, bh = face_box
+    side = max(bw * W, bh * H) * (1 + 2 * pad)
+    cx = (bx + bw / 2) * W
+    cy = (by + bh / 2) * H
+
+    x0 = int(max(cx - side / 2, 0))
+    y0 = int(max(cy - side / 2, 0))
+    x1 = int(min(cx + side / 2, W))
+    y1 = int(min(cy + side / 2, H))
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+
+    crop = np.ascontiguousarray(frame[y0:y1, x0:x1])
+    return crop, (x0, y0, x1 - x0, y1 - y0)
+
+
+def _landmark_xy(lm, idx, roi, frame_shape):
+    """Landmark position in full-frame normalized coordinates."""
+    x, y = lm[idx].x, lm[idx].y
+    if roi is None:
+        return np.array([x, y])
+
+    H, W = frame_shape[:2]
+    x0, y0, cw, ch = roi
+    return np.array([(x0 + x * cw) / W, (y0 + y * ch) / H])
+
+
+def estimate_head_pose(face_model, frame, face_box=None, pad=0.5, roi_model=None):
+    """
+    Runs the face mesh graph on one frame.
+    Returns yaw / pitch / roll proxies, or None if no face was found.
 
+    With a step 2 face box, roi_model (a static-image graph, see
+    create_face_roi_model) runs on a padded crop around the face (see
+    face_roi) and landmarks are mapped back to full-frame coordinates,
+    so the output is on the same scale either way. Frames without a
+    usable box go to the tracking face_model as before.
+    """
+    if face_box is not None and roi_model is None:
+        raise ValueError("face_box needs a static-image roi_model (see create_face_roi_model)")
+
+    roi = None
+    image = frame
+    model = face_model
+    cropped = face_roi(frame, face_box, pad)
+    if cropped is not None:
+        (image, roi), model = cropped, roi_model
+
+    result = model.process(image)
+    if not result.multi_face_landmarks:
+        return None
+
+    lm = result.multi_face_landmarks[0].landmark
+
+    # Simple proxy angles (sufficient for behavior)
+    left_eye = _landmark_xy(lm, 33, roi, frame.shape)
+    right_eye = _landmark_xy(lm, 263, roi, frame.shape)
+    nose = _landmark_xy(lm, 1, roi, frame.shape)
+
+    yaw = right_eye[0] - left_eye[0]
+    pitch = nose[1] - (left_eye[1] + right_eye[1]) / 2
+    roll = right_eye[1] - left_eye[1]
+
+    return {
+        "yaw": float(yaw),
+        "pitch": float(pitch),
+        "roll": float(roll)
+    }
+
+
+def extract_head_pose_sequence(frames, valid_mask, face_boxes=None):
+    head_seq = []
+
+    if face_boxes is None:
+        face_boxes = [None] * len(frames)
+
+    with open_graph("face_mesh", create_face_mesh_model) as face_model, \
+            open_roi_graph(any(box is not None for box in face_boxes)) as roi_model:
+        for frame, valid, box in zip(frames, valid_mask, face_boxes):
+            if not valid:
+                head_seq.append(None)
+                continue
+
+            head_seq.append(estimate_head_pose(face_model, frame, box, roi_model=roi_model))
+
+    return head_seq
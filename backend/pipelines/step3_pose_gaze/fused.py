@@ -0,0 +1,107 @@
+from itertools import islice
+
+from pipelines.graph_pool import open_graph
+from pipelines.step2_preprocessing.face_filter import FaceCountTracker, create_face_detector
+from pipelines.step2_preprocessing.video_loader import iter_resampled_frames
+from pipelines.step2_preprocessing.validity import (
+    VALIDITY_CHUNK_SIZE,
+    count_faces_tracked,
+    evaluate_video_quality,
+    new_validity_stats,
+    validate_frame_batch
+)
+
+from .extract import estimate_frame
+from .face_mesh import create_face_mesh_model, open_roi_graph
+from .pose_extractor import create_pose_model
+from .sequence import SequenceBuilder
+
+
+def run_fused(
+    frame_stream,
+    face_every_n=1,
+    chunk_size=VALIDITY_CHUNK_SIZE,
+    face_roi=False,
+    pose_width=None
+):
+    """
+    Step 2 validity and step 3 landmarks in a single pass.
+
+    Each chunk of frames is read once; face detection, the quality rules,
+    pose and face mesh all work on the same buffers. Frames are marked
+    read-only so MediaPipe can take them by reference instead of copying.
+    A holistic graph is not used because it tracks one person only and
+    cannot produce the face counts the validity rules need.
+
+    face_roi and pose_width are as in run_step3; the face box comes
+    straight from this chunk's face detection.
+
+    frame_stream yields (frame, timestamp). Returns the validity results
+    together with the step 3 sequence.
+    """
+    frame_stream = iter(frame_stream)
+
+    stats = new_validity_stats()
+    builder = SequenceBuilder()
+
+    with open_graph("face_detection", create_face_detector) as detector, \
+            open_graph("pose", create_pose_model) as pose_model, \
+            open_graph("face_mesh", create_face_mesh_model) as face_model, \
+            open_roi_graph(face_roi) as roi_model:
+
+        tracker = FaceCountTracker(detector, every_n=face_every_n)
+
+        while True:
+            chunk = list(islice(frame_stream, chunk_size))
+            if not chunk:
+                break
+
+            frames = [frame for frame, _ in chunk]
+            for frame in frames:
+                frame.flags.writeable = False
+
+            boxes = []
+            face_counts = count_faces_tracked(tracker, frames, stats, boxes)
+            batch = validate_frame_batch(frames, face_counts, stats)
+
+            for (frame, t), valid, box in zip(chunk, batch["valid"], boxes):
+                builder.append(estimate_frame(
+                    pose_model, face_model, frame, t, bool(valid),
+                    face_box=box if face_roi else None,
+                    pose_width=pose_width,
+                    roi_model=roi_model
+                ))
+
+    sequence = builder.build()
+    valid_mask = sequence.valid.tolist()
+
+    return {
+        "sequence": sequence,
+        "timestamps": sequence.t.tolist(),
+        "valid_mask": valid_mask,
+        "stats": stats
+    }
+
+
+def extract_video_fused(video_path, face_every_n=1, face_roi=False, pose_width=None):
+    """
+    Fused replacement for preprocess_video followed by run_step3.
+    Decodes the video once and never holds more than one chunk of frames.
+    """
+    out = run_fused(
+        iter_resampled_frames(video_path),
+        face_every_n=face_every_n,
+        face_roi=face_roi,
+        pose_width=pose_width
+    )
+    decision = evaluate_video_quality(out["valid_mask"], out["stats"])
+
+    out.update({
+        "usable": decision["usable"],
+        "reason": decision["reason"],
+        "metadata": {
+            "fps": 25,
+            "num_frames": len(out["valid_mask"])
+        }
+    })
+    return out
@@ -1,21 +1,18 @@
-def estimate_gaze_sequence(head_seq):
-    gaze_seq = []
-
-    for head in head_seq:
-        if head is None:
-            gaze_seq.append(None)
-            continue
+def estimate_gaze(head):
+    if head is None:
+        return None
 
-        # Simple heuristic
-        gx = -head["yaw"]
-        gy = -head["pitch"]
-        gz = 1.0  # forward bias
+    # Simple heuristic
+    gx = -head["yaw"]
+    gy = -head["pitch"]
+    gz = 1.0  # forward bias
 
-        gaze_seq.append({
-            "gx": float(gx),
-            "gy": float(gy),
-            "gz": float(gz)
-        })
+    return {
+        "gx": float(gx),
+        "gy": float(gy),
+        "gz": float(gz)
+    }
 
-    return gaze_seq
 
+def estimate_gaze_sequence(head_seq):
+    return [estimate_gaze(head) for head in head_seq]
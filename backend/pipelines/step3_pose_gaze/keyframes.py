@@ -0,0 +1,129 @@
+import numpy as np
+
+from pipelines.step2_preprocessing.quality_checks import frames_to_luma
+
+
+class KeyframeSelector:
+    """
+    Motion-adaptive keyframe choice for step 3.
+
+    Each valid frame is reduced to a small luma image (`scale` of the
+    frame size). A frame is a keyframe, i.e. the landmark models run on
+    it, when the mean absolute luma difference against the last keyframe
+    exceeds `threshold` (0-255 scale), when `max_skip` frames have been
+    skipped in a row, or when it is the first valid frame after an
+    invalid one. Invalid frames are never keyframes.
+    """
+
+    def __init__(self, threshold=3.0, max_skip=4, scale=0.125):
+        self.threshold = threshold
+        self.max_skip = max(int(max_skip), 0)
+        self.scale = scale
+
+        self._last_luma = None
+        self._skipped = 0
+
+    def is_keyframe(self, frame, valid):
+        if not valid:
+            self._last_luma = None
+            return False
+
+        luma = frames_to_luma([frame], self.scale)[0].astype(np.int16)
+
+        key = (
+            self._last_luma is None
+            or self._skipped >= self.max_skip
+            or np.abs(luma - self._last_luma).mean() > self.threshold
+        )
+
+        if key:
+            self._last_luma = luma
+            self._skipped = 0
+        else:
+            self._skipped += 1
+
+        return key
+
+
+def select_keyframes(frames, valid_mask, threshold=3.0, max_skip=4, scale=0.125):
+    """Keyframe mask (T,) for a list of frames, see KeyframeSelector."""
+    selector = KeyframeSelector(threshold, max_skip, scale)
+    return np.array(
+        [selector.is_keyframe(f, v) for f, v in zip(frames, valid_mask)],
+        dtype=bool
+    )
+
+
+def _interpolate_column(x, idx, prev_key, next_key, has_next):
+    """
+    Fills x[idx] from the keyframes around it: linear between the two
+    when both have a value, otherwise whichever one does.
+    """
+    x_prev = x[prev_key]
+    x_next = np.where(has_next.reshape((-1,) + (1,) * (x.ndim - 1)), x[next_key], np.nan)
+
+    span = np.where(has_next, next_key - prev_key, 1)
+    w = ((idx - prev_key) / span).astype(np.float32)
+    w = w.reshape((-1,) + (1,) * (x.ndim - 1))
+
+    filled = x_prev + w * (x_next - x_prev)
+    filled = np.where(np.isnan(x_next), x_prev, filled)
+    filled = np.where(np.isnan(x_prev), x_next, filled)
+
+    x[idx] = filled
+
+
+def interpolate_skipped(sequence, keyframe):
+    """
+    Fills pose / head / gaze of skipped frames (valid but not keyframes)
+    in place. Skipped frames are interpolated between the surrounding
+    keyframes of the same valid run; after the last keyframe of a run
+    the last value is held. Gaze is linear in head pose, so interpolating
+    it directly matches recomputing it.
+    """
+    keyframe = np.asarray(keyframe, dtype=bool)
+    valid = sequence.valid
+    skipped = np.flatnonzero(valid & ~keyframe)
+    if skipped.size == 0:
+        return sequence
+
+    T = len(sequence)
+    positions = np.arange(T)
+
+    prev_key = np.maximum.accumulate(np.where(keyframe, positions, -1))
+    next_key = np.minimum.accumulate(np.where(keyframe, positions, T)[::-1])[::-1]
+
+    # Valid-run id per frame; a keyframe in a later run must not be used
+    run_id = np.cumsum(np.concatenate(([valid[0]], valid[1:] & ~valid[:-1])))
+
+    # Every valid run starts with a keyframe when KeyframeSelector picked
+    # them; anything else has nothing to interpolate from and stays missing
+    skipped = skipped[prev_key[skipped] >= 0]
+    skipped = skipped[run_id[prev_key[skipped]] == run_id[skipped]]
+    if skipped.size == 0:
+        return sequence
+
+    p = prev_key[skipped]
+    n = np.minimum(next_key[skipped], T - 1)
+    has_next = (next_key[skipped] < T) & (run_id[n] == run_id[skipped])
+
+    for column in (sequence.pose, sequence.head, sequence.gaze):
+        _interpolate_column(column, skipped, p, n, has_next)
+
+    return sequence
+
+
+def skip_report(valid_mask, keyframe):
+    """How many valid frames skipped the landmark models."""
+    valid = np.asarray(valid_mask, dtype=bool)
+    keyframe = np.asarray(keyframe, dtype=bool)
+
+    n_valid = int(valid.sum())
+    n_key = int((valid & keyframe).sum())
+
+    return {
+        "valid_frames": n_valid,
+        "keyframes": n_key,
+        "skipped_frames": n_valid - n_key,
+        "skip_ratio": (n_valid - n_key) / n_valid if n_valid else 0.0
+    }
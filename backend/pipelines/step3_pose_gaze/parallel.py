@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def _run_segment(args):
+    fn, frames, valid_mask, extras, warmup = args
+    return fn(frames, valid_mask, *extras)[warmup:]
+
+
+def run_segmented(fn, frames, valid_mask, num_workers=4, warmup=25, extras=()):
+    """
+    Runs a stateful per-sequence extractor (e.g. extract_pose_sequence)
+    over `num_workers` contiguous segments in a process pool.
+
+    Each segment is prefixed with up to `warmup` frames from the previous
+    segment so MediaPipe tracking and landmark smoothing can settle; the
+    outputs for those frames are discarded before stitching. `fn` must be
+    a picklable top-level function taking (frames, valid_mask) and
+    returning one entry per frame.
+
+    `extras` are further per-frame sequences (e.g. face boxes), sliced
+    like the frames and passed to `fn` as extra positional arguments.
+    """
+    T = len(frames)
+    if num_workers <= 1 or T == 0:
+        return fn(frames, valid_mask, *extras)
+
+    edges = np.linspace(0, T, num_workers + 1).astype(int)
+
+    jobs = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop <= start:
+            continue
+        w0 = max(start - warmup, 0)
+        jobs.append((
+            fn,
+            frames[w0:stop],
+            valid_mask[w0:stop],
+            tuple(extra[w0:stop] for extra in extras),
+            start - w0
+        ))
+
+    with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+        parts = list(pool.map(_run_segment, jobs))
+
+    out = []
+    for part in parts:
+        out.extend(part)
+    return out
@@ -0,0 +1,153 @@
+import queue
+import threading
+
+from pipelines.graph_pool import open_graph
+from pipelines.step2_preprocessing.video_loader import iter_resampled_frames
+from pipelines.step2_preprocessing.validity import (
+    evaluate_video_quality,
+    iter_validity,
+    new_validity_stats
+)
+
+from .face_mesh import create_face_mesh_model, estimate_head_pose, open_roi_graph
+from .gaze_estimator import estimate_gaze
+from .pose_extractor import create_pose_model, estimate_pose
+from .sequence import SequenceBuilder
+
+_DONE = object()
+
+# Seconds between checks of the stop flag while blocked on a queue
+_POLL = 0.1
+
+
+def _iter_queue(q, stop):
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=_POLL)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_stage(work, q_in, q_out, stop, errors):
+    """
+    Runs one pipeline stage: `work` maps an input iterator to an output
+    iterator. Any exception stops every stage and is re-raised by the caller.
+    """
+    try:
+        items = _iter_queue(q_in, stop) if q_in is not None else None
+        for out in (work(items) if items is not None else work()):
+            if not _put(q_out, out, stop):
+                return
+        _put(q_out, _DONE, stop)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+
+
+def _pose_stage(items, pose_width=None):
+    with open_graph("pose", create_pose_model) as pose_model:
+        for frame, t, valid, box in items:
+            pose = estimate_pose(pose_model, frame, pose_width) if valid else None
+            yield frame, t, valid, box, pose
+
+
+def _face_mesh_stage(items, face_roi=False):
+    with open_graph("face_mesh", create_face_mesh_model) as face_model, \
+            open_roi_graph(face_roi) as roi_model:
+        for frame, t, valid, box, pose in items:
+            box = box if face_roi else None
+            head = estimate_head_pose(face_model, frame, box, roi_model=roi_model) if valid else None
+            yield {
+                "t": t,
+                "pose": pose,
+                "head": head,
+                "gaze": estimate_gaze(head),
+                "valid": valid
+            }
+
+
+def extract_video_pipelined(
+    video_path,
+    queue_size=64,
+    face_every_n=1,
+    face_roi=False,
+    pose_width=None
+):
+    """
+    Producer / consumer version of preprocess_video + run_step3.
+
+    Decoding, validity checks (face filter + quality rules), pose and
+    face mesh each run in their own thread, connected by bounded queues
+    of `queue_size` items. OpenCV and MediaPipe release the GIL in their
+    native code, so stages overlap and end-to-end latency approaches the
+    slowest stage rather than the sum. Each MediaPipe graph is created
+    and used inside a single thread. Memory is bounded by the queues.
+
+    Returns the same dict as extract_video_fused.
+    """
+    stats = new_validity_stats()
+    stop = threading.Event()
+    errors = []
+
+    stages = [
+        lambda: iter_resampled_frames(video_path),
+        lambda items: iter_validity(
+            items, stats, face_every_n=face_every_n, with_boxes=True
+        ),
+        lambda items: _pose_stage(items, pose_width),
+        lambda items: _face_mesh_stage(items, face_roi),
+    ]
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    threads = []
+    for i, work in enumerate(stages):
+        q_in = queues[i - 1] if i > 0 else None
+        threads.append(threading.Thread(
+            target=_run_stage,
+            args=(work, q_in, queues[i], stop, errors),
+            daemon=True
+        ))
+
+    for th in threads:
+        th.start()
+
+    builder = SequenceBuilder()
+    for frame in _iter_queue(queues[-1], stop):
+        builder.append(frame)
+
+    stop.set()
+    for th in threads:
+        th.join()
+
+    if errors:
+        raise errors[0]
+
+    sequence = builder.build()
+    valid_mask = sequence.valid.tolist()
+    decision = evaluate_video_quality(valid_mask, stats)
+
+    return {
+        "sequence": sequence,
+        "timestamps": sequence.t.tolist(),
+        "valid_mask": valid_mask,
+        "stats": stats,
+        "usable": decision["usable"],
+        "reason": decision["reason"],
+        "metadata": {
+            "fps": 25,
+            "num_frames": len(valid_mask)
+        }
+    }
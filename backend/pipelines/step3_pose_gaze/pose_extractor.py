@@ -1,47 +1,67 @@
+import cv2
 import mediapipe as mp
 import numpy as np
 
+from pipelines.graph_pool import open_graph
+from .sequence import POSE_JOINTS
+
 mp_pose = mp.solutions.pose
 
-POSE_JOINTS = [
-    "nose",
-    "left_shoulder", "right_shoulder",
-    "left_elbow", "right_elbow",
-    "left_wrist", "right_wrist",
-    "left_hip", "right_hip"
-]
 
-def extract_pose_sequence(frames, valid_mask):
-    pose_seq = []
+def create_pose_model():
+    return mp_pose.Pose(static_image_mode=False)
 
-    with mp_pose.Pose(static_image_mode=False) as pose_model:
-        for frame, valid in zip(frames, valid_mask):
-            if not valid:
-                pose_seq.append(None)
-                continue
 
-            result = pose_model.process(frame)
-            if not result.pose_landmarks:
-                pose_seq.append(None)
-                continue
+def downscale(frame, max_width=None):
+    """Shrinks frames wider than max_width, keeping the aspect ratio."""
+    h, w = frame.shape[:2]
+    if max_width is None or w <= max_width:
+        return frame
 
-            lm = result.pose_landmarks.landmark
+    size = (int(max_width), max(int(round(h * max_width / w)), 1))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
 
-            joints = {}
-            for name in POSE_JOINTS:
-                idx = mp_pose.PoseLandmark[name.upper()].value
-                joints[name] = np.array([lm[idx].x, lm[idx].y, lm[idx].z])
 
-            # Torso center & scale
-            torso = (joints["left_hip"] + joints["right_hip"]) / 2
-            shoulder_width = np.linalg.norm(
-                joints["left_shoulder"] - joints["right_shoulder"]
-            ) + 1e-6
+def estimate_pose(pose_model, frame, max_width=None):
+    """
+    Runs the pose graph on one frame.
+    Returns torso-normalized joints, or None if no body was found.
 
-            for k in joints:
-                joints[k] = (joints[k] - torso) / shoulder_width
+    max_width runs the graph on a downscaled copy. Landmarks are
+    normalized to the image size, so the output scale does not change.
+    """
+    result = pose_model.process(downscale(frame, max_width))
+    if not result.pose_landmarks:
+        return None
 
-            pose_seq.append(joints)
+    lm = result.pose_landmarks.landmark
 
-    return pose_seq
+    joints = {}
+    for name in POSE_JOINTS:
+        idx = mp_pose.PoseLandmark[name.upper()].value
+        joints[name] = np.array([lm[idx].x, lm[idx].y, lm[idx].z])
+
+    # Torso center & scale
+    torso = (joints["left_hip"] + joints["right_hip"]) / 2
+    shoulder_width = np.linalg.norm(
+        joints["left_shoulder"] - joints["right_shoulder"]
+    ) + 1e-6
+
+    for k in joints:
+        joints[k] = (joints[k] - torso) / shoulder_width
 
+    return joints
+
+
+def extract_pose_sequence(frames, valid_mask, max_width=None):
+    pose_seq = []
+
+    with open_graph("pose", create_pose_model) as pose_model:
+        for frame, valid in zip(frames, valid_mask):
+            if not valid:
+                pose_seq.append(None)
+                continue
+
+            pose_seq.append(estimate_pose(pose_model, frame, max_width))
+
+    return pose_seq
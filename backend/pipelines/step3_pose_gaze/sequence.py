@@ -0,0 +1,170 @@
+import numpy as np
+
+from .keyframes import skip_report
+
+POSE_JOINTS = [
+    "nose",
+    "left_shoulder", "right_shoulder",
+    "left_elbow", "right_elbow",
+    "left_wrist", "right_wrist",
+    "left_hip", "right_hip"
+]
+
+HEAD_KEYS = ("yaw", "pitch", "roll")
+GAZE_KEYS = ("gx", "gy", "gz")
+
+
+class PoseGazeSequence:
+    """
+    Columnar (struct-of-arrays) step 3 output.
+
+    t      (T,)        float64 timestamps
+    valid  (T,)        bool step 2 validity
+    pose   (T, J, 3)   float32 joints, NaN where no pose was found
+    head   (T, 3)      float32 yaw / pitch / roll, NaN where missing
+    gaze   (T, 3)      float32 gx / gy / gz, NaN where missing
+
+    Indexing with an int (or iterating) gives the old per-frame dict, with
+    None for missing pose / head / gaze, so existing callers keep working.
+    Slicing returns another PoseGazeSequence sharing the same memory.
+    `fps` is the nominal frame rate when known. `keyframe` (T,) bool is
+    set when landmarks were only computed on keyframes and interpolated
+    elsewhere (see keyframes.py); None means every valid frame was run.
+    """
+
+    def __init__(self, t, valid, pose, head, gaze, joints=POSE_JOINTS, fps=None, keyframe=None):
+        self.joints = list(joints)
+        self.fps = fps
+        self.keyframe = None if keyframe is None else np.asarray(keyframe, dtype=bool)
+        self.t = np.asarray(t, dtype=np.float64)
+        self.valid = np.asarray(valid, dtype=bool)
+        self.pose = np.asarray(pose, dtype=np.float32)
+        self.head = np.asarray(head, dtype=np.float32)
+        self.gaze = np.asarray(gaze, dtype=np.float32)
+
+    @classmethod
+    def empty(cls, n_frames, joints=POSE_JOINTS):
+        """All-missing sequence of n_frames, to be filled in place."""
+        return cls(
+            t=np.zeros(n_frames, dtype=np.float64),
+            valid=np.zeros(n_frames, dtype=bool),
+            pose=np.full((n_frames, len(joints), 3), np.nan, dtype=np.float32),
+            head=np.full((n_frames, len(HEAD_KEYS)), np.nan, dtype=np.float32),
+            gaze=np.full((n_frames, len(GAZE_KEYS)), np.nan, dtype=np.float32),
+            joints=joints
+        )
+
+    @classmethod
+    def from_frames(cls, frames, joints=POSE_JOINTS):
+        """Builds the columnar form from a list of step 3 frame dicts."""
+        builder = SequenceBuilder(joints)
+        for frame in frames:
+            builder.append(frame)
+        return builder.build()
+
+    @property
+    def pose_present(self):
+        return ~np.all(np.isnan(self.pose), axis=(1, 2))
+
+    @property
+    def head_present(self):
+        return ~np.all(np.isnan(self.head), axis=1)
+
+    @property
+    def gaze_present(self):
+        return ~np.all(np.isnan(self.gaze), axis=1)
+
+    @property
+    def skip_ratio(self):
+        """Share of valid frames whose landmarks were interpolated."""
+        if self.keyframe is None:
+            return 0.0
+        return skip_report(self.valid, self.keyframe)["skip_ratio"]
+
+    def __len__(self):
+        return len(self.t)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return PoseGazeSequence(
+                self.t[idx], self.valid[idx], self.pose[idx],
+                self.head[idx], self.gaze[idx], self.joints, self.fps,
+                None if self.keyframe is None else self.keyframe[idx]
+            )
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("PoseGazeSequence index out of range")
+
+        return self._frame_dict(idx)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._frame_dict(i)
+
+    def _frame_dict(self, i):
+        pose = None
+        if not np.all(np.isnan(self.pose[i])):
+            pose = {name: self.pose[i, j] for j, name in enumerate(self.joints)}
+
+        return {
+            "t": float(self.t[i]),
+            "pose": pose,
+            "head": _row_dict(self.head[i], HEAD_KEYS),
+            "gaze": _row_dict(self.gaze[i], GAZE_KEYS),
+            "valid": bool(self.valid[i])
+        }
+
+    def to_dicts(self):
+        return list(self)
+
+
+def _row_dict(row, keys):
+    if np.all(np.isnan(row)):
+        return None
+    return {k: float(v) for k, v in zip(keys, row)}
+
+
+class SequenceBuilder:
+    """
+    Appends step 3 frame dicts straight into growing columnar buffers,
+    so a full list of per-frame dicts never has to exist.
+    """
+
+    def __init__(self, joints=POSE_JOINTS, capacity=1024):
+        self.joints = list(joints)
+        self._seq = PoseGazeSequence.empty(capacity, self.joints)
+        self._n = 0
+
+    def _grow(self):
+        old = self._seq
+        self._seq = PoseGazeSequence.empty(2 * len(old), self.joints)
+        for name in ("t", "valid", "pose", "head", "gaze"):
+            getattr(self._seq, name)[:len(old)] = getattr(old, name)
+
+    def append(self, frame):
+        if self._n == len(self._seq):
+            self._grow()
+
+        i, seq = self._n, self._seq
+        seq.t[i] = frame["t"] if frame["t"] is not None else np.nan
+        seq.valid[i] = frame["valid"]
+
+        if frame["pose"] is not None:
+            for j, name in enumerate(self.joints):
+                seq.pose[i, j] = frame["pose"][name]
+        if frame["head"] is not None:
+            seq.head[i] = [frame["head"][k] for k in HEAD_KEYS]
+        if frame["gaze"] is not None:
+            seq.gaze[i] = [frame["gaze"][k] for k in GAZE_KEYS]
+
+        self._n += 1
+
+    def build(self):
+        n = self._n
+        seq = self._seq
+        return PoseGazeSequence(
+            seq.t[:n].copy(), seq.valid[:n].copy(), seq.pose[:n].copy(),
+            seq.head[:n].copy(), seq.gaze[:n].copy(), self.joints
+        )
@@ -1,26 +1,176 @@
+"""
+Content-addressed step 4 feature cache.
+
+An entry is keyed by the SHA-256 of the source file, the extraction
+parameters and FEATURE_VERSION, so renamed or same-named files from
+different users cannot collide, and changing window_sec or the feature
+code simply misses. Entries are float32 .npz files (X plus column names)
+written atomically. The directory is kept under a size limit by evicting
+the least recently used entries (file mtime is refreshed on every hit).
+"""
+
+import hashlib
+import json
 import os
-import pickle
+import tempfile
+
+import numpy as np
+
+from .engine import FEATURE_VERSION
+from .extract import features_to_dicts
+
+CACHE_DIR = os.environ.get(
+    "STEP4_CACHE_DIR",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "cache", "step4_features"
+    )
+)
+
+# 2 GiB
+DEFAULT_MAX_BYTES = 2 << 30
+
+# Parameters of extract_features that change its output
+DEFAULT_PARAMS = {"fps": 25, "window_sec": 2, "stride_sec": 1, "task_name": None}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FeatureCache:
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        # path -> ((size, mtime_ns), sha256); avoids rehashing unchanged files
+        self._hashes = {}
+
+    def source_hash(self, path):
+        st = os.stat(path)
+        fingerprint = (st.st_size, st.st_mtime_ns)
+
+        known = self._hashes.get(path)
+        if known is not None and known[0] == fingerprint:
+            return known[1]
+
+        digest = file_sha256(path)
+        self._hashes[path] = (fingerprint, digest)
+        return digest
+
+    def key(self, source_path, **params):
+        payload = json.dumps({
+            "source": self.source_hash(source_path),
+            "params": {**DEFAULT_PARAMS, **params},
+            "version": FEATURE_VERSION,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def has_entry(self, key):
+        """True if the entry with this key (as returned by save) is on disk."""
+        return os.path.exists(self._entry_path(key))
+
+    def load(self, source_path, **params):
+        """(X float32, names) for a cached extraction, or None."""
+        path = self._entry_path(self.key(source_path, **params))
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                X, names = data["X"], data["names"].tolist()
+        except (OSError, KeyError, ValueError):
+            # Missing, or unreadable (e.g. truncated by a crash before this
+            # cache wrote atomically): treat as a miss
+            self.stats["misses"] += 1
+            return None
+
+        try:
+            os.utime(path)  # LRU recency
+        except FileNotFoundError:
+            # Evicted by another process since the read; the data is loaded
+            pass
+        self.stats["hits"] += 1
+        return X, names
+
+    def save(self, source_path, X, names, **params):
+        """Writes the entry and returns its key."""
+        key = self.key(source_path, **params)
+        path = self._entry_path(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    X=np.asarray(X, dtype=np.float32),
+                    names=np.asarray(names, dtype=str)
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        self.stats["writes"] += 1
+        self.evict()
+        return key
+
+    def evict(self):
+        """Deletes least recently used entries until under max_bytes."""
+        if self.max_bytes is None or not os.path.isdir(self.cache_dir):
+            return
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
 
-CACHE_DIR = "backend/cache/step4_features"
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.stats["evictions"] += 1
 
 
-def _cache_path(session_path):
-    name = os.path.basename(session_path)
-    return os.path.join(CACHE_DIR, name.replace(".json", ".pkl"))
+_default_cache = None
 
 
-def load_step4(session_path):
-    path = _cache_path(session_path)
-    if os.path.exists(path):
-        with open(path, "rb") as f:
-            return pickle.load(f)
-    return None
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = FeatureCache()
+    return _default_cache
 
 
-def save_step4(session_path, features):
-    path = _cache_path(session_path)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "wb") as f:
-        pickle.dump(features, f)
+def load_step4(session_path, **params):
+    """Cached extract_features output (list of dicts) or None."""
+    cached = default_cache().load(session_path, **params)
+    if cached is None:
+        return None
+    return features_to_dicts(*cached)
 
 
+def save_step4(session_path, features, **params):
+    """Caches an extract_features result (list of dicts)."""
+    names = list(features[0]) if features else []
+    X = np.array([[f[k] for k in names] for f in features], dtype=np.float32)
+    default_cache().save(session_path, X.reshape(len(features), len(names)), names, **params)
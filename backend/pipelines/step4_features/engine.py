@@ -0,0 +1,580 @@
+import numpy as np
+
+from .motion_features import UPPER_BODY_JOINTS, upper_body_motion_energy
+from .symmetry_features import arm_symmetry
+
+
+# Bump whenever a change alters feature values, so cached results expire
+FEATURE_VERSION = 1
+
+TASK_MAP = {
+    "imitation": [1, 0, 0],
+    "joint_attention": [0, 1, 0],
+    "turn_taking": [0, 0, 1],
+}
+
+TASK_FEATURE_NAMES = ["task_imitation", "task_joint_attention", "task_turn_taking"]
+
+_JOINT_INDEX = {name: j for j, name in enumerate(UPPER_BODY_JOINTS)}
+
+
+def _scalar(source, key):
+    """source[key] as a float, NaN when source or value is missing."""
+    if source is None:
+        return np.nan
+    value = source.get(key)
+    if value is None:
+        return np.nan
+    return float(value)
+
+
+def frame_values(frame):
+    """
+    Per-frame inputs of every step 4 feature:
+    (valid, has_skeleton, joints, (rx, ry), (yaw, pitch)).
+
+    joints is the (J, D) float64 array of UPPER_BODY_JOINTS, or None when
+    the skeleton is missing, lacks a joint, is ragged or non-finite.
+    Missing angles are NaN.
+    """
+    eye = frame.get("eye_gaze")
+    head = frame.get("head_gaze")
+    angles = (_scalar(eye, "rx"), _scalar(eye, "ry"))
+    head_angles = (_scalar(head, "yaw"), _scalar(head, "pitch"))
+
+    skeleton = frame.get("skeleton")
+    if skeleton is None:
+        return frame["valid"], False, None, angles, head_angles
+
+    try:
+        row = np.array([skeleton[j] for j in UPPER_BODY_JOINTS], dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        return frame["valid"], True, None, angles, head_angles
+
+    if row.ndim != 2 or not np.isfinite(row).all():
+        row = None
+
+    return frame["valid"], True, row, angles, head_angles
+
+
+def frame_arrays(sequence):
+    """
+    Reads a step 4 input sequence (frame dicts with valid / skeleton /
+    eye_gaze / head_gaze) into per-frame arrays, once.
+
+    valid     (T,)       bool
+    pose      (T,)       bool, skeleton present
+    coords    (T, J, D)  float64 upper-body joints (UPPER_BODY_JOINTS order)
+    regular   (T,)       bool, every joint present with a finite D-vector
+                         of the same size D as the first such frame
+    eye       (T, 2)     float64 eye_gaze rx / ry, NaN where missing
+    head      (T, 2)     float64 head_gaze yaw / pitch, NaN where missing
+    """
+    T = len(sequence)
+    valid = np.zeros(T, dtype=bool)
+    pose = np.zeros(T, dtype=bool)
+    regular = np.zeros(T, dtype=bool)
+    eye = np.full((T, 2), np.nan)
+    head = np.full((T, 2), np.nan)
+
+    rows = [None] * T
+    dim = None
+
+    for i, s in enumerate(sequence):
+        valid[i], pose[i], row, eye[i], head[i] = frame_values(s)
+        if row is None:
+            continue
+
+        if dim is None:
+            dim = row.shape[1]
+        if row.shape[1] != dim:
+            continue
+
+        rows[i] = row
+        regular[i] = True
+
+    coords = np.zeros((T, len(UPPER_BODY_JOINTS), dim or 1))
+    for i in np.flatnonzero(regular):
+        coords[i] = rows[i]
+
+    return {
+        "valid": valid,
+        "pose": pose,
+        "coords": coords,
+        "regular": regular,
+        "eye": eye,
+        "head": head,
+    }
+
+
+def window_starts(valid, window_size, stride, max_gap=3):
+    """
+    Start indices of the windows sliding_windows keeps: every `stride`
+    frames, dropping windows with more than `max_gap` invalid frames.
+    """
+    T = len(valid)
+    starts = np.array(range(0, T - window_size + 1, stride), dtype=np.int64)
+
+    invalid = np.concatenate(([0], np.cumsum(~np.asarray(valid, dtype=bool))))
+    n_invalid = invalid[starts + window_size] - invalid[starts]
+
+    return starts[n_invalid <= max_gap]
+
+
+def _prefix(x):
+    return np.concatenate(([0.0], np.cumsum(x)))
+
+
+def moment_prefix(x):
+    """
+    Prefix sums for windowed moments of a per-frame signal: count of
+    non-NaN values, and sums / sums of squares of the values centred on
+    their overall mean (which keeps the variance well conditioned).
+    Built once per signal, then any range is O(1), see range_moments.
+    """
+    present = ~np.isnan(x)
+    centre = x[present].mean() if present.any() else 0.0
+    d = np.where(present, x - centre, 0.0)
+    return centre, _prefix(present), _prefix(d), _prefix(d * d)
+
+
+def range_moments(prefix, lo, hi):
+    """
+    (count, mean, population var) of the non-NaN values in x[lo:hi] for
+    many ranges at once. Mean and var are 0 for ranges without values,
+    matching _safe_var / _safe_std in attention_features.
+    """
+    centre, c, s1, s2 = prefix
+
+    n = c[hi] - c[lo]
+    safe_n = np.maximum(n, 1.0)
+    m = (s1[hi] - s1[lo]) / safe_n
+    var = np.maximum((s2[hi] - s2[lo]) / safe_n - m * m, 0.0)
+
+    empty = n == 0
+    return n, np.where(empty, 0.0, m + centre), np.where(empty, 0.0, var)
+
+
+def sparse_table(x):
+    """
+    Range-maximum table: row k holds max(x[i:i + 2**k]), padded with
+    -inf. O(n log n) to build, O(1) per query (see range_max).
+    """
+    n = len(x)
+    levels = max(int(np.log2(n)) + 1, 1) if n else 1
+    table = np.full((levels, n), -np.inf)
+    if n:
+        table[0] = x
+    for k in range(1, levels):
+        half = 1 << (k - 1)
+        table[k, :n - 2 * half + 1] = np.maximum(
+            table[k - 1, :n - 2 * half + 1], table[k - 1, half:n - half + 1]
+        )
+    return table
+
+
+def range_max(table, lo, hi):
+    """max(x[lo:hi]) for non-empty ranges, from a sparse_table of x."""
+    if lo.size == 0:
+        return np.zeros(0)
+    k = np.log2(hi - lo).astype(np.int64)
+    return np.maximum(table[k, lo], table[k, hi - (1 << k)])
+
+
+# ---------- Registry ----------
+#
+# Intermediates are named per-sequence values (per-frame arrays, or
+# per-window statistics) that declare the values they are computed from.
+# Features declare the intermediates they read and return one column.
+# A run computes only what the requested features need, each value once.
+# The base inputs are "sequence", "starts" and "window_size"; values that
+# do not depend on the windows are shared between window scales.
+
+INTERMEDIATES = {}
+FEATURES = {}
+
+
+def intermediate(name, requires=()):
+    def register(fn):
+        INTERMEDIATES[name] = (tuple(requires), fn)
+        return fn
+    return register
+
+
+def feature(name, requires=()):
+    def register(fn):
+        FEATURES[name] = (tuple(requires), fn)
+        return fn
+    return register
+
+
+WINDOW_INPUTS = ("starts", "window_size")
+
+
+def window_dependent(name):
+    """True when an intermediate changes with the window length / stride."""
+    if name in WINDOW_INPUTS:
+        return True
+    requires = INTERMEDIATES.get(name, ((), None))[0]
+    return any(window_dependent(r) for r in requires)
+
+
+class _Context:
+    """
+    Memoized intermediates for one window scale of a sequence.
+    Window-independent values go to `shared`, which scales of the same
+    sequence pass around so they are computed only once.
+    """
+
+    def __init__(self, shared, **inputs):
+        self.shared = shared
+        self._values = dict(inputs)
+
+    def __getitem__(self, name):
+        if name in self._values:
+            return self._values[name]
+        if name in self.shared:
+            return self.shared[name]
+
+        requires, fn = INTERMEDIATES[name]
+        value = fn(*(self[r] for r in requires))
+        if window_dependent(name):
+            self._values[name] = value
+        else:
+            self.shared[name] = value
+        return value
+
+
+def required_intermediates(names):
+    """Every intermediate the given features need, dependencies included."""
+    needed, stack = set(), []
+    for name in names:
+        stack.extend(FEATURES[name][0])
+
+    while stack:
+        name = stack.pop()
+        if name in needed or name not in INTERMEDIATES:
+            continue
+        needed.add(name)
+        stack.extend(INTERMEDIATES[name][0])
+
+    return needed
+
+
+# ---------- Intermediates ----------
+
+@intermediate("arrays", requires=("sequence",))
+def _arrays(sequence):
+    return frame_arrays(sequence)
+
+
+@intermediate("window_ends", requires=("starts", "window_size"))
+def _window_ends(starts, window_size):
+    return starts + window_size
+
+
+@intermediate("pose_frames", requires=("arrays",))
+def _pose_frames(arrays):
+    """Joint coordinates of the frames that have a skeleton, compacted."""
+    pose_idx = np.flatnonzero(arrays["pose"])
+    return pose_idx, arrays["coords"][pose_idx]
+
+
+@intermediate("pose_ranges", requires=("arrays", "pose_frames", "starts", "window_ends"))
+def _pose_ranges(arrays, pose_frames, starts, ends):
+    """
+    Compacted pose-frame range [a, b) of every window, and the windows
+    holding an irregular skeleton (missing joints, odd shapes, non-finite
+    values). Those are recomputed with the per-window functions.
+    """
+    pose_idx, _ = pose_frames
+    a = np.searchsorted(pose_idx, starts)
+    b = np.searchsorted(pose_idx, ends)
+
+    irregular = _prefix(~arrays["regular"][pose_idx])
+    fallback = (irregular[b] - irregular[a]) > 0
+    return a, b, fallback
+
+
+@intermediate("joint_speeds", requires=("pose_frames",))
+def _joint_speeds(pose_frames):
+    """Mean over joints of joint speed, between consecutive pose frames."""
+    _, P = pose_frames
+    if len(P) < 2:
+        return np.zeros(0)
+    return np.linalg.norm(np.diff(P, axis=0), axis=2).mean(axis=1)
+
+
+@intermediate("speed_prefix", requires=("joint_speeds",))
+def _speed_prefix(speeds):
+    return moment_prefix(speeds)
+
+
+@intermediate("speed_table", requires=("joint_speeds",))
+def _speed_table(speeds):
+    return sparse_table(speeds)
+
+
+@intermediate("speed_ranges", requires=("pose_ranges",))
+def _speed_ranges(pose_ranges):
+    """Windows with at least one speed step, and their step ranges."""
+    a, b, fallback = pose_ranges
+    moving = (b - a >= 2) & ~fallback
+    return moving, a[moving], b[moving] - 1
+
+
+@intermediate("speed_moments", requires=("speed_prefix", "speed_ranges"))
+def _speed_moments(prefix, speed_ranges):
+    moving, lo, hi = speed_ranges
+    mean, std = np.zeros(len(moving)), np.zeros(len(moving))
+    _, mean[moving], var = range_moments(prefix, lo, hi)
+    std[moving] = np.sqrt(var)
+    return mean, std
+
+
+def _lr_distance(pose_frames, left, right):
+    _, P = pose_frames
+    j = _JOINT_INDEX
+    return np.linalg.norm(P[:, j[left]] - P[:, j[right]], axis=1)
+
+
+def _lr_moments(prefix, pose_ranges):
+    """Window mean and std of one left-right distance, over pose frames."""
+    a, b, fallback = pose_ranges
+    posed = (b - a >= 1) & ~fallback
+
+    mean, std = np.zeros(len(a)), np.zeros(len(a))
+    _, mean[posed], var = range_moments(prefix, a[posed], b[posed])
+    std[posed] = np.sqrt(var)
+    return mean, std
+
+
+@intermediate("wrist_lr_prefix", requires=("pose_frames",))
+def _wrist_lr_prefix(pose_frames):
+    """Moment prefix of the left-right wrist distance per pose frame."""
+    return moment_prefix(_lr_distance(pose_frames, "wrist_left", "wrist_right"))
+
+
+@intermediate("hand_lr_prefix", requires=("pose_frames",))
+def _hand_lr_prefix(pose_frames):
+    """Moment prefix of the left-right hand distance per pose frame."""
+    return moment_prefix(_lr_distance(pose_frames, "hand_left", "hand_right"))
+
+
+@intermediate("wrist_lr_moments", requires=("wrist_lr_prefix", "pose_ranges"))
+def _wrist_lr_moments(prefix, pose_ranges):
+    return _lr_moments(prefix, pose_ranges)
+
+
+@intermediate("hand_lr_moments", requires=("hand_lr_prefix", "pose_ranges"))
+def _hand_lr_moments(prefix, pose_ranges):
+    return _lr_moments(prefix, pose_ranges)
+
+
+@intermediate("motion_fallback", requires=("sequence", "starts", "window_size", "pose_ranges"))
+def _motion_fallback(sequence, starts, window_size, pose_ranges):
+    return {
+        w: upper_body_motion_energy(sequence[starts[w]:starts[w] + window_size])
+        for w in np.flatnonzero(pose_ranges[2])
+    }
+
+
+@intermediate("symmetry_fallback", requires=("sequence", "starts", "window_size", "pose_ranges"))
+def _symmetry_fallback(sequence, starts, window_size, pose_ranges):
+    return {
+        w: arm_symmetry(sequence[starts[w]:starts[w] + window_size])
+        for w in np.flatnonzero(pose_ranges[2])
+    }
+
+
+@intermediate("angle_prefix", requires=("arrays",))
+def _angle_prefix(arrays):
+    """Moment prefixes of eye rx / ry and head yaw / pitch, in that order."""
+    columns = np.concatenate([arrays["eye"], arrays["head"]], axis=1)
+    return [moment_prefix(columns[:, c]) for c in range(4)]
+
+
+@intermediate("angle_vars", requires=("angle_prefix", "starts", "window_ends"))
+def _angle_vars(angle_prefix, starts, ends):
+    """Window nanvar of eye rx / ry and head yaw / pitch."""
+    return [range_moments(prefix, starts, ends)[2] for prefix in angle_prefix]
+
+
+# ---------- Features ----------
+
+def _patched(column, fallback, name):
+    column = column.copy()
+    for w, feats in fallback.items():
+        column[w] = feats[name]
+    return column
+
+
+@feature("motion_mean", requires=("speed_moments", "motion_fallback"))
+def _motion_mean(moments, fallback):
+    return _patched(moments[0], fallback, "motion_mean")
+
+
+@feature("motion_std", requires=("speed_moments", "motion_fallback"))
+def _motion_std(moments, fallback):
+    return _patched(moments[1], fallback, "motion_std")
+
+
+@feature("motion_max", requires=("speed_table", "speed_ranges", "motion_fallback"))
+def _motion_max(table, speed_ranges, fallback):
+    moving, lo, hi = speed_ranges
+    column = np.zeros(len(moving))
+    column[moving] = range_max(table, lo, hi)
+    return _patched(column, fallback, "motion_max")
+
+
+@feature("wrist_lr_mean_dist", requires=("wrist_lr_moments", "symmetry_fallback"))
+def _wrist_lr_mean_dist(moments, fallback):
+    return _patched(moments[0], fallback, "wrist_lr_mean_dist")
+
+
+@feature("wrist_lr_std_dist", requires=("wrist_lr_moments", "symmetry_fallback"))
+def _wrist_lr_std_dist(moments, fallback):
+    return _patched(moments[1], fallback, "wrist_lr_std_dist")
+
+
+@feature("hand_lr_mean_dist", requires=("hand_lr_moments", "symmetry_fallback"))
+def _hand_lr_mean_dist(moments, fallback):
+    return _patched(moments[0], fallback, "hand_lr_mean_dist")
+
+
+@feature("hand_lr_std_dist", requires=("hand_lr_moments", "symmetry_fallback"))
+def _hand_lr_std_dist(moments, fallback):
+    return _patched(moments[1], fallback, "hand_lr_std_dist")
+
+
+@feature("eye_gaze_var_rx", requires=("angle_vars",))
+def _eye_gaze_var_rx(angle_vars):
+    return angle_vars[0]
+
+
+@feature("eye_gaze_var_ry", requires=("angle_vars",))
+def _eye_gaze_var_ry(angle_vars):
+    return angle_vars[1]
+
+
+@feature("head_yaw_std", requires=("angle_vars",))
+def _head_yaw_std(angle_vars):
+    return np.sqrt(angle_vars[2])
+
+
+@feature("head_pitch_std", requires=("angle_vars",))
+def _head_pitch_std(angle_vars):
+    return np.sqrt(angle_vars[3])
+
+
+# Default feature set, in column order
+FEATURE_NAMES = list(FEATURES)
+
+
+def _feature_names(features):
+    names = list(FEATURE_NAMES if features is None else features)
+    unknown = [name for name in names if name not in FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown features: {unknown}")
+    return names
+
+
+def _scale_features(shared, names, window_size, stride, task_name, max_gap):
+    """Feature matrix of one window scale, reusing `shared` intermediates."""
+    arrays = shared["arrays"]
+    starts = window_starts(arrays["valid"], window_size, stride, max_gap)
+    ctx = _Context(shared, starts=starts, window_size=window_size)
+
+    task_vec = None
+    if task_name is not None:
+        task_vec = TASK_MAP.get(task_name.lower())
+        if task_vec is None and len(starts):
+            raise ValueError(f"Unknown task: {task_name}")
+
+    n_task = len(TASK_FEATURE_NAMES) if task_name is not None else 0
+    X = np.zeros((len(starts), len(names) + n_task))
+
+    for k, name in enumerate(names):
+        requires, fn = FEATURES[name]
+        X[:, k] = fn(*(ctx[r] for r in requires))
+
+    if task_vec is not None:
+        X[:, len(names):] = task_vec
+
+    return X
+
+
+def _output_names(names, task_name):
+    return names + TASK_FEATURE_NAMES if task_name is not None else names
+
+
+def compute_window_features(
+    sequence,
+    fps=25,
+    window_sec=2,
+    stride_sec=1,
+    task_name=None,
+    max_gap=3,
+    dtype=np.float32,
+    features=None
+):
+    """
+    Vectorized step 4: sliding-window features of a sequence at once.
+
+    Per-frame quantities (joint speeds, wrist / hand distances, gaze and
+    head angles) are computed once for the whole sequence and window
+    statistics come from prefix sums, so overlapping windows share the
+    work. Windows and values match extract_features.
+
+    `features` picks registered features by name (default: all of
+    FEATURE_NAMES); only the intermediates they declare are computed.
+
+    Returns (X, names): an (N_windows, F) matrix (float32 by default)
+    and the F feature names in column order.
+    """
+    names = _feature_names(features)
+    shared = {"sequence": sequence, "arrays": frame_arrays(sequence)}
+
+    X = _scale_features(
+        shared, names,
+        int(round(window_sec * fps)), int(round(stride_sec * fps)),
+        task_name, max_gap
+    )
+    return X.astype(dtype, copy=False), _output_names(names, task_name)
+
+
+# (window_sec, stride_sec) pairs used for research feature sets
+DEFAULT_SCALES = ((1, 0.5), (2, 1), (5, 2.5), (10, 5))
+
+
+def compute_multiscale_features(
+    sequence,
+    scales=DEFAULT_SCALES,
+    fps=25,
+    task_name=None,
+    max_gap=3,
+    dtype=np.float32,
+    features=None
+):
+    """
+    compute_window_features for several (window_sec, stride_sec) scales
+    in one pass. Per-frame signals, their prefix sums and the range-max
+    table are built once and shared; each scale only adds its O(1)
+    per-window lookups (and the per-window fallbacks, if any).
+
+    Returns ({(window_sec, stride_sec): X}, names), one (N_windows, F)
+    matrix per scale, each equal to the single-scale result.
+    """
+    names = _feature_names(features)
+    shared = {"sequence": sequence, "arrays": frame_arrays(sequence)}
+
+    tensors = {}
+    for window_sec, stride_sec in scales:
+        X = _scale_features(
+            shared, names,
+            int(round(window_sec * fps)), int(round(stride_sec * fps)),
+            task_name, max_gap
+        )
+        tensors[(window_sec, stride_sec)] = X.astype(dtype, copy=False)
+
+    return tensors, _output_names(names, task_name)
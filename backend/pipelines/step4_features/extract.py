@@ -1,14 +1,7 @@
-from .windowing import sliding_windows
-from .motion_features import upper_body_motion_energy
-from .symmetry_features import arm_symmetry
-from .attention_features import gaze_stability, head_motion
+import numpy as np
 
-
-TASK_MAP = {
-    "imitation": [1, 0, 0],
-    "joint_attention": [0, 1, 0],
-    "turn_taking": [0, 0, 1],
-}
+# TASK_MAP is re-exported for callers that imported it from here
+from .engine import TASK_MAP, TASK_FEATURE_NAMES, compute_window_features
 
 
 def extract_features(
@@ -16,34 +9,33 @@ def extract_features(
     fps=25,
     window_sec=2,
     stride_sec=1,
-    task_name=None
+    task_name=None,
+    features=None
 ):
-    window_size = int(round(window_sec * fps))
-    stride      = int(round(stride_sec * fps))
-
-    windows = sliding_windows(sequence, window_size, stride)
+    """
+    One feature dict per kept sliding window.
+    Thin wrapper over the vectorized engine (compute_window_features);
+    use that directly when a (N_windows, F) matrix is what you need.
+    `features` limits the dicts to those registered feature names.
+    """
+    X, names = compute_window_features(
+        sequence, fps, window_sec, stride_sec, task_name,
+        dtype=np.float64, features=features
+    )
+    return features_to_dicts(X, names)
+
+
+def features_to_dicts(X, names):
+    """Rows of a feature matrix as extract_features-style dicts."""
     feature_vectors = []
+    for row in X:
+        feats = {name: float(v) for name, v in zip(names, row)}
 
-    for w in windows:
-        feats = {}
-
-        # Core behavioral features
-        feats.update(upper_body_motion_energy(w))
-        feats.update(arm_symmetry(w))
-        feats.update(gaze_stability(w))
-        feats.update(head_motion(w))
-
-        # Task context (optional but recommended)
-        if task_name is not None:
-            task_vec = TASK_MAP.get(task_name.lower())
-            if task_vec is None:
-                raise ValueError(f"Unknown task: {task_name}")
-
-            feats["task_imitation"] = task_vec[0]
-            feats["task_joint_attention"] = task_vec[1]
-            feats["task_turn_taking"] = task_vec[2]
+        # Task context keeps its integer one-hot values
+        for name in TASK_FEATURE_NAMES:
+            if name in feats:
+                feats[name] = int(feats[name])
 
         feature_vectors.append(feats)
 
     return feature_vectors
-
@@ -0,0 +1,259 @@
+import math
+from collections import deque
+
+import numpy as np
+
+from .engine import FEATURE_NAMES, TASK_FEATURE_NAMES, TASK_MAP, _JOINT_INDEX, frame_values
+from .motion_features import upper_body_motion_energy
+from .symmetry_features import arm_symmetry
+
+# Features kept in rolling accumulators, by the accumulator they come from
+POSE_FEATURES = (
+    "motion_mean", "motion_std", "motion_max",
+    "wrist_lr_mean_dist", "wrist_lr_std_dist",
+    "hand_lr_mean_dist", "hand_lr_std_dist",
+)
+ANGLE_FEATURES = ("eye_gaze_var_rx", "eye_gaze_var_ry", "head_yaw_std", "head_pitch_std")
+
+# Registry order, so the dicts match extract_features column for column
+STREAMING_FEATURES = tuple(n for n in FEATURE_NAMES if n in POSE_FEATURES + ANGLE_FEATURES)
+assert len(STREAMING_FEATURES) == len(POSE_FEATURES + ANGLE_FEATURES), \
+    "streamed feature missing from the step 4 registry"
+
+
+class RollingMoments:
+    """
+    Mean / population variance of a sliding set of values (Welford's
+    update with removal). NaN values are ignored on both add and remove,
+    so count() is the number of non-NaN values currently inside. Empty
+    windows report 0, like _safe_var / _safe_std.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        if math.isnan(x):
+            return
+        self.n += 1
+        delta = x - self._mean
+        self._mean += delta / self.n
+        self._m2 += delta * (x - self._mean)
+
+    def remove(self, x):
+        if math.isnan(x):
+            return
+        if self.n <= 1:
+            self.n, self._mean, self._m2 = 0, 0.0, 0.0
+            return
+        old_mean = (self.n * self._mean - x) / (self.n - 1)
+        self._m2 -= (x - old_mean) * (x - self._mean)
+        self._mean = old_mean
+        self.n -= 1
+
+    def count(self):
+        return self.n
+
+    @property
+    def mean(self):
+        return self._mean if self.n else 0.0
+
+    @property
+    def var(self):
+        return max(self._m2 / self.n, 0.0) if self.n else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+
+class RollingMax:
+    """
+    Sliding maximum over keyed values (keys increase as values are
+    pushed), using a monotonic deque: push and expire are amortised O(1).
+    NaN values are ignored.
+    """
+
+    def __init__(self):
+        self._items = deque()
+
+    def push(self, key, x):
+        if math.isnan(x):
+            return
+        while self._items and self._items[-1][1] <= x:
+            self._items.pop()
+        self._items.append((key, x))
+
+    def expire(self, min_key):
+        """Drops values whose key is below min_key."""
+        while self._items and self._items[0][0] < min_key:
+            self._items.popleft()
+
+    @property
+    def max(self):
+        return self._items[0][1] if self._items else 0.0
+
+
+class StreamingFeatureExtractor:
+    """
+    Frame-at-a-time step 4: push() frames as they arrive and get the
+    feature dict of each window as soon as its last frame is in.
+
+    Every statistic is kept in a rolling accumulator that is updated as
+    frames enter and leave the window, so each emitted window costs
+    O(stride) rather than O(window). Windows, drop rule and values match
+    extract_features. Windows holding an irregular skeleton (missing
+    joints etc.) are recomputed from the buffered frames with the
+    per-window functions, as the vectorized engine does. The columns
+    are STREAMING_FEATURES (plus task columns); registry features with
+    no rolling accumulator are not streamed.
+    """
+
+    def __init__(self, fps=25, window_sec=2, stride_sec=1, task_name=None, max_gap=3):
+        self.window_size = int(round(window_sec * fps))
+        self.stride = int(round(stride_sec * fps))
+        self.max_gap = max_gap
+
+        self.task_vec = None
+        if task_name is not None:
+            self.task_vec = TASK_MAP.get(task_name.lower())
+            if self.task_vec is None:
+                raise ValueError(f"Unknown task: {task_name}")
+
+        self._frames = deque()   # (index, frame dict, values)
+        self._steps = deque()    # (key, speed), key = earlier pose frame
+        self._t = 0
+
+        self._invalid = 0
+        self._irregular = 0
+        self._dim = None
+        self._last_pose = None   # (index, joints or None)
+
+        self._speed = RollingMoments()
+        self._speed_max = RollingMax()
+        self._wrist = RollingMoments()
+        self._hand = RollingMoments()
+        self._angles = [RollingMoments() for _ in range(4)]
+
+    def _joints(self, row):
+        if row is None:
+            return None
+        if self._dim is None:
+            self._dim = row.shape[1]
+        return row if row.shape[1] == self._dim else None
+
+    def _enter(self, i, frame):
+        valid, has_pose, row, eye, head = frame_values(frame)
+        joints = self._joints(row) if has_pose else None
+
+        dists = (math.nan, math.nan)
+        if has_pose:
+            self._irregular += joints is None
+
+            if joints is not None:
+                j = _JOINT_INDEX
+                dists = (
+                    float(np.linalg.norm(joints[j["wrist_left"]] - joints[j["wrist_right"]])),
+                    float(np.linalg.norm(joints[j["hand_left"]] - joints[j["hand_right"]])),
+                )
+
+            # A step is only kept while its earlier frame can share a window
+            if self._last_pose is not None and self._last_pose[0] > i - self.window_size:
+                key, prev = self._last_pose
+                speed = math.nan
+                if prev is not None and joints is not None:
+                    speed = float(np.linalg.norm(joints - prev, axis=1).mean())
+                self._steps.append((key, speed))
+                self._speed.add(speed)
+                self._speed_max.push(key, speed)
+
+            self._last_pose = (i, joints)
+
+        values = (valid, has_pose, joints is None, dists, eye + head)
+        self._frames.append((i, frame, values))
+
+        self._invalid += not valid
+        self._wrist.add(dists[0])
+        self._hand.add(dists[1])
+        for acc, x in zip(self._angles, eye + head):
+            acc.add(x)
+
+    def _leave(self):
+        i, _, (valid, has_pose, irregular, dists, angles) = self._frames.popleft()
+
+        self._invalid -= not valid
+        self._irregular -= has_pose and irregular
+        self._wrist.remove(dists[0])
+        self._hand.remove(dists[1])
+        for acc, x in zip(self._angles, angles):
+            acc.remove(x)
+
+        # Steps starting at this frame are no longer inside the window
+        while self._steps and self._steps[0][0] <= i:
+            _, speed = self._steps.popleft()
+            self._speed.remove(speed)
+        self._speed_max.expire(i + 1)
+
+    def _features(self):
+        if self._irregular:
+            window = [frame for _, frame, _ in self._frames]
+            pose = {**upper_body_motion_energy(window), **arm_symmetry(window)}
+        else:
+            pose = {
+                "motion_mean": self._speed.mean,
+                "motion_std": self._speed.std,
+                "motion_max": self._speed_max.max if self._speed.count() else 0.0,
+                "wrist_lr_mean_dist": self._wrist.mean,
+                "wrist_lr_std_dist": self._wrist.std,
+                "hand_lr_mean_dist": self._hand.mean,
+                "hand_lr_std_dist": self._hand.std,
+            }
+
+        rx, ry, yaw, pitch = self._angles
+        values = {
+            **pose,
+            "eye_gaze_var_rx": rx.var,
+            "eye_gaze_var_ry": ry.var,
+            "head_yaw_std": yaw.std,
+            "head_pitch_std": pitch.std,
+        }
+        feats = {name: float(values[name]) for name in STREAMING_FEATURES}
+
+        if self.task_vec is not None:
+            feats.update(zip(TASK_FEATURE_NAMES, self.task_vec))
+
+        return feats
+
+    def push(self, frame):
+        """
+        Adds the next frame. Returns the feature dict of the window that
+        ends at this frame, or None if no window ends here or it was
+        dropped for having too many invalid frames.
+        """
+        i = self._t
+        self._t += 1
+
+        self._enter(i, frame)
+        if len(self._frames) > self.window_size:
+            self._leave()
+
+        start = i - self.window_size + 1
+        if start < 0 or start % self.stride:
+            return None
+        if self._invalid > self.max_gap:
+            return None
+
+        return self._features()
+
+
+def extract_features_streaming(sequence, fps=25, window_sec=2, stride_sec=1, task_name=None):
+    """extract_features computed with rolling accumulators."""
+    extractor = StreamingFeatureExtractor(fps, window_sec, stride_sec, task_name)
+    feature_vectors = []
+    for frame in sequence:
+        feats = extractor.push(frame)
+        if feats is not None:
+            feature_vectors.append(feats)
+    return feature_vectors
@@ -0,0 +1,230 @@
+"""
+Parallel, resumable step 4 feature extraction over the DREAM corpus.
+
+Sessions are fanned out to a process pool. Each worker loads the session
+(from the binary DREAM store when it is fresh, otherwise from JSON), runs
+compute_window_features and writes the result to the step 4 feature
+cache, exactly as the serial loop in run_step5 does, so run_step5 then
+finds every session in the cache.
+
+A JSON manifest records each session as completed, skipped or failed
+(with the reason) together with the source size / mtime. Re-running
+skips sessions already completed or skipped for unchanged sources and
+retries failures, so an interrupted run resumes where it stopped. A
+completed session whose cache entry has since been evicted is extracted
+again.
+
+The cache is trimmed to max_cache_bytes before extraction, never after,
+so every session this run completes is still cached when it returns.
+"""
+
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipelines.step3_pose_gaze.dream_adapter import load_dream_sequence
+from pipelines.step4_features.cache import CACHE_DIR, DEFAULT_MAX_BYTES, DEFAULT_PARAMS, FeatureCache
+from pipelines.step4_features.engine import FEATURE_VERSION, compute_window_features
+
+from .dream_loader import load_user_sessions
+from .dream_store import MANIFEST, DreamStore
+
+MANIFEST_VERSION = 2
+CORPUS_MANIFEST = "corpus_manifest.json"
+
+# Seconds between manifest checkpoints while the pool is running
+CHECKPOINT_INTERVAL = 5.0
+
+# Per-process state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(cache_dir, dream_store_dir):
+    # Eviction is left to the parent so workers never race on deletes
+    _worker["cache"] = FeatureCache(cache_dir, max_bytes=None)
+    _worker["store"] = None
+    if dream_store_dir and os.path.exists(os.path.join(dream_store_dir, MANIFEST)):
+        _worker["store"] = DreamStore(dream_store_dir)
+
+
+def _extract_session(source, params):
+    """
+    One session: load, extract, cache. Returns the manifest record;
+    any exception becomes a "failed" record instead of killing the run.
+    """
+    record = {"status": "completed", "windows": 0, "reason": None, "cache_key": None}
+
+    try:
+        store = _worker["store"]
+        if store is not None and store.is_fresh(source):
+            sequence = store.load_sequence(source)
+        else:
+            sequence = load_dream_sequence(source)
+
+        if not sequence:
+            record.update(status="skipped", reason="no usable frames")
+            return record
+
+        X, names = compute_window_features(sequence, **params)
+        if len(X) == 0:
+            record.update(status="skipped", reason="no valid windows")
+            return record
+
+        record["cache_key"] = _worker["cache"].save(source, X, names, **params)
+        record["windows"] = len(X)
+    except Exception as e:
+        record.update(
+            status="failed",
+            reason=f"{type(e).__name__}: {e}",
+            traceback=traceback.format_exc(limit=5)
+        )
+
+    return record
+
+
+def _fingerprint(source):
+    st = os.stat(source)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def load_corpus_manifest(path, params):
+    """
+    Previous manifest at `path`, or a fresh one when it is missing or
+    was written for other parameters / feature code.
+    """
+    fresh = {
+        "version": MANIFEST_VERSION,
+        "feature_version": FEATURE_VERSION,
+        "params": params,
+        "sessions": {},
+    }
+    if not os.path.exists(path):
+        return fresh
+
+    with open(path, "r") as f:
+        manifest = json.load(f)
+
+    same_run = (
+        manifest.get("version") == MANIFEST_VERSION
+        and manifest.get("feature_version") == FEATURE_VERSION
+        and manifest.get("params") == params
+    )
+    return manifest if same_run else fresh
+
+
+def save_corpus_manifest(path, manifest):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _is_done(record, source, cache):
+    if record is None or record["status"] == "failed":
+        return False
+    try:
+        fp = _fingerprint(source)
+    except FileNotFoundError:
+        return False
+    if record.get("size") != fp["size"] or record.get("mtime_ns") != fp["mtime_ns"]:
+        return False
+
+    # Completed only counts while its features are still in the cache. The
+    # key saved with the record is checked, so resuming never rehashes sources
+    return record["status"] == "skipped" or cache.has_entry(record["cache_key"])
+
+
+def extract_corpus(
+    root_dir,
+    num_workers=None,
+    cache_dir=CACHE_DIR,
+    dream_store_dir=None,
+    manifest_path=None,
+    max_cache_bytes=DEFAULT_MAX_BYTES,
+    **params
+):
+    """
+    Extracts and caches step 4 features for every session under root_dir.
+
+    num_workers defaults to the CPU count; 1 runs in this process.
+    params are compute_window_features arguments (fps, window_sec,
+    stride_sec, task_name) and must match the ones the cache is read
+    with later. max_cache_bytes trims the cache before extraction, so
+    it should fit the whole corpus or run_step5 misses evicted sessions.
+    Returns a summary of counts plus the failed sessions.
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    num_workers = num_workers or os.cpu_count() or 1
+
+    manifest_path = manifest_path or os.path.join(cache_dir, CORPUS_MANIFEST)
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+
+    manifest = load_corpus_manifest(manifest_path, params)
+    records = manifest["sessions"]
+
+    # Evict first: entries written by this run must survive it
+    cache = FeatureCache(cache_dir, max_bytes=max_cache_bytes)
+    cache.evict()
+
+    users = load_user_sessions(root_dir)
+    pending = []
+    for user_id, sessions in users.items():
+        for source in sessions:
+            source = os.path.abspath(source)
+            if not _is_done(records.get(source), source, cache):
+                pending.append((user_id, source))
+
+    total = sum(len(s) for s in users.values())
+    done = total - len(pending)
+    print(f"[CORPUS] {total} sessions, {done} already done, {len(pending)} to extract")
+
+    counts = {"completed": 0, "skipped": 0, "failed": 0}
+    last_checkpoint = time.monotonic()
+
+    def record_result(user_id, source, record):
+        nonlocal done, last_checkpoint
+        records[source] = {"user": user_id, **record, **_fingerprint(source)}
+        counts[record["status"]] += 1
+        done += 1
+
+        line = f"[CORPUS] {done}/{total} {record['status']}: {user_id}/{os.path.basename(source)}"
+        if record["reason"]:
+            line += f" ({record['reason']})"
+        print(line)
+
+        if time.monotonic() - last_checkpoint > CHECKPOINT_INTERVAL:
+            save_corpus_manifest(manifest_path, manifest)
+            last_checkpoint = time.monotonic()
+
+    try:
+        if num_workers <= 1:
+            _init_worker(cache_dir, dream_store_dir)
+            for user_id, source in pending:
+                record_result(user_id, source, _extract_session(source, params))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=_init_worker,
+                initargs=(cache_dir, dream_store_dir)
+            ) as pool:
+                futures = {
+                    pool.submit(_extract_session, source, params): (user_id, source)
+                    for user_id, source in pending
+                }
+                for future in as_completed(futures):
+                    user_id, source = futures[future]
+                    record_result(user_id, source, future.result())
+    finally:
+        # Also on KeyboardInterrupt, so the next run resumes from here
+        save_corpus_manifest(manifest_path, manifest)
+
+    return {
+        **counts,
+        "already_done": total - len(pending),
+        "total": total,
+        "failed_sessions": {
+            source: r["reason"] for source, r in records.items() if r["status"] == "failed"
+        },
+    }
@@ -1,11 +1,32 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import StandardScaler
+from sklearn.utils.validation import check_is_fitted
+
+# Rows per partial_fit call when fitting the scaler
+SCALER_CHUNK_ROWS = 1 << 16
 
 
 class WindowSequenceDataset:
     """
     Builds (N, T, F) tensors from Step-4 window features.
     Handles scaling correctly.
+
+    `features` keeps the unscaled (N_windows, F) matrix as given, so a
+    memory-mapped FeatureStore selection stays on disk: the scaler is
+    fitted with partial_fit over chunks of it, and sequences are read
+    from a sliding-window view and scaled only when they are copied out,
+    one at a time in __getitem__ or a whole batch at once with get_batch.
+
+    `features` is either a list of feature dicts or an (N_windows, F)
+    array (e.g. a FeatureStore selection) with its column names in
+    `feature_names`.
+
+    `session_lengths` gives the number of windows of each consecutive
+    session in `features`. Sequences are then only started where they
+    fit inside one session; the valid start offsets are computed once
+    here and index the view. Without it the rows are one session.
+    `name` (e.g. "train") labels the split in error messages.
     """
 
     def __init__(
@@ -13,38 +34,85 @@ class WindowSequenceDataset:
         features,
         seq_len=10,
         scaler=None,
-        fit_scaler=False
+        fit_scaler=False,
+        feature_names=None,
+        session_lengths=None,
+        name=None
     ):
         assert len(features) > seq_len, "Not enough windows"
 
-        self.keys = list(features[0].keys())
+        if isinstance(features, np.ndarray):
+            self.keys = list(feature_names) if feature_names is not None else None
+            X = np.asarray(features, dtype=np.float32)
+        else:
+            self.keys = list(features[0].keys())
 
-        X = np.array(
-            [[f[k] for k in self.keys] for f in features],
-            dtype=np.float32
-        )
+            X = np.array(
+                [[f[k] for k in self.keys] for f in features],
+                dtype=np.float32
+            )
 
         # ---------- SCALING ----------
         if scaler is None:
             scaler = StandardScaler()
 
         if fit_scaler:
-            X = scaler.fit_transform(X)
+            for i in range(0, len(X), SCALER_CHUNK_ROWS):
+                scaler.partial_fit(X[i:i + SCALER_CHUNK_ROWS])
         else:
-            X = scaler.transform(X)
+            check_is_fitted(scaler)
 
         self.scaler = scaler
-        self.X = self._build_sequences(X, seq_len)
+        self.seq_len = seq_len
+        self.features = X
+        self._windows = self._build_sequences(self.features, seq_len)
+        self.starts = self._valid_starts(len(self.features), seq_len, session_lengths)
+
+        if len(self.starts) == 0:
+            raise ValueError(
+                f"No session in the {name or 'given'} split has {seq_len} windows"
+            )
+
+    @property
+    def feature_dim(self):
+        return self.features.shape[-1]
+
+    def _scale(self, windows):
+        # StandardScaler.transform, applied to just the rows being read
+        x = np.array(windows, dtype=np.float32)
+        if self.scaler.mean_ is not None:
+            x -= self.scaler.mean_
+        if self.scaler.scale_ is not None:
+            x /= self.scaler.scale_
+        return x
 
     def _build_sequences(self, X, seq_len):
-        seqs = []
-        for i in range(len(X) - seq_len + 1):
-            seqs.append(X[i:i + seq_len])
-        return np.array(seqs, dtype=np.float32)
+        # (N - seq_len + 1, seq_len, F) view; no data is copied
+        return sliding_window_view(X, seq_len, axis=0).transpose(0, 2, 1)
+
+    def _valid_starts(self, n_rows, seq_len, session_lengths):
+        if session_lengths is None:
+            return np.arange(n_rows - seq_len + 1, dtype=np.int64)
+
+        lengths = np.asarray(session_lengths, dtype=np.int64)
+        if lengths.sum() != n_rows:
+            raise ValueError(
+                f"session_lengths sum to {lengths.sum()}, but there are {n_rows} windows"
+            )
+
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        return np.concatenate([
+            np.arange(o, o + l - seq_len + 1, dtype=np.int64)
+            for o, l in zip(offsets, lengths) if l >= seq_len
+        ] or [np.zeros(0, dtype=np.int64)])
 
     def __len__(self):
-        return len(self.X)
+        return len(self.starts)
 
     def __getitem__(self, idx):
-        return self.X[idx]
+        return self._scale(self._windows[self.starts[idx]])
+
+    def get_batch(self, indices):
+        """(B, seq_len, F) float32 batch of the given sequence indices, in one gather."""
+        return self._scale(self._windows[self.starts[np.asarray(indices, dtype=np.int64)]])
 
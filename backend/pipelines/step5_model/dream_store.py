@@ -0,0 +1,228 @@
+"""
+Binary columnar store for the DREAM 1.2 corpus.
+
+Layout of a store directory:
+    manifest.json   users, sessions, frame rates, row ranges, source hashes
+    t.bin           float64 (N,)
+    valid.bin       bool    (N,)
+    pose.bin        float32 (N, 6, 3)
+    head.bin        float32 (N, 3)
+    gaze.bin        float32 (N, 3)
+
+All sessions are concatenated along the frame axis; each manifest entry
+records its [offset, offset + length) row range. Columns are opened with
+np.memmap, so reopening the whole corpus costs a JSON read, and a
+session is a zero-copy slice. Values are exactly what load_dream_sequence
+returns (missing values as 0.0).
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+from pipelines.step3_pose_gaze.dream_adapter import DREAM_JOINTS, load_dream_sequence
+from pipelines.step3_pose_gaze.sequence import PoseGazeSequence
+from pipelines.step4_features.cache import file_sha256
+
+from .dream_loader import load_user_sessions
+
+STORE_VERSION = 1
+MANIFEST = "manifest.json"
+
+COLUMNS = {
+    "t": (np.float64, ()),
+    "valid": (np.bool_, ()),
+    "pose": (np.float32, (len(DREAM_JOINTS), 3)),
+    "head": (np.float32, (3,)),
+    "gaze": (np.float32, (3,)),
+}
+
+
+def _source_fingerprint(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+class DreamStore:
+    """Read side of the store. Cheap to open; data stays on disk until sliced."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+        with open(os.path.join(store_dir, MANIFEST), "r") as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported DREAM store version in {store_dir}")
+
+        self.entries = self.manifest["sessions"]
+        self._by_source = {e["source"]: e for e in self.entries}
+
+        n_rows = self.manifest["num_frames"]
+        self.columns = {}
+        for name, (dtype, tail) in COLUMNS.items():
+            path = os.path.join(store_dir, f"{name}.bin")
+            if n_rows == 0:
+                self.columns[name] = np.zeros((0,) + tail, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(path, dtype=dtype, mode="r", shape=(n_rows,) + tail)
+
+    def users(self):
+        """dict[user_id] -> list of session source paths, like load_user_sessions."""
+        users = {}
+        for e in self.entries:
+            users.setdefault(e["user"], []).append(e["source"])
+        return users
+
+    def entry(self, source):
+        return self._by_source.get(os.path.abspath(source))
+
+    def is_fresh(self, source, verify_hash=False):
+        """
+        True if `source` is in the store and unchanged. Size and mtime are
+        compared first; the SHA-256 is only recomputed when they differ
+        (or when verify_hash=True).
+        """
+        e = self.entry(source)
+        if e is None or not os.path.exists(source):
+            return False
+
+        fp = _source_fingerprint(source)
+        if not verify_hash and fp["size"] == e["size"] and fp["mtime"] == e["mtime"]:
+            return True
+        return file_sha256(source) == e["sha256"]
+
+    def stale_sources(self, root_dir, verify_hash=False):
+        """Session files under root_dir that are new or changed since the build."""
+        stale = []
+        for sessions in load_user_sessions(root_dir).values():
+            for source in sessions:
+                if not self.is_fresh(source, verify_hash):
+                    stale.append(os.path.abspath(source))
+        return stale
+
+    def load_sequence(self, source):
+        """
+        Memory-mapped PoseGazeSequence for one session, or [] if the
+        session was skipped at build time (same contract as load_dream_sequence).
+        """
+        e = self.entry(source)
+        if e is None:
+            raise KeyError(f"{source} is not in the DREAM store")
+        if e["length"] == 0:
+            return []
+
+        rows = slice(e["offset"], e["offset"] + e["length"])
+        c = self.columns
+        return PoseGazeSequence(
+            c["t"][rows], c["valid"][rows], c["pose"][rows],
+            c["head"][rows], c["gaze"][rows],
+            joints=[name for name, _ in DREAM_JOINTS],
+            fps=e["frame_rate"]
+        )
+
+
+def build_dream_store(root_dir, store_dir, verify_hash=False):
+    """
+    Converts every session under root_dir into the binary store at store_dir.
+
+    When a store already exists, sessions whose source is unchanged are
+    copied over from it and only new or changed files are re-parsed. The
+    new store is written next to the old one and swapped in at the end;
+    an interrupted build leaves the old store untouched and no temp dir.
+
+    Sessions that yield no frames, or whose parse raises (e.g. a
+    non-numeric frame_rate), are kept as empty entries with the reason in
+    the manifest and in summary["skipped_sessions"].
+    """
+    previous = None
+    if os.path.exists(os.path.join(store_dir, MANIFEST)):
+        previous = DreamStore(store_dir)
+
+    tmp_dir = store_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    outputs = {
+        name: open(os.path.join(tmp_dir, f"{name}.bin"), "wb")
+        for name in COLUMNS
+    }
+
+    entries = []
+    offset = 0
+    summary = {"parsed": 0, "reused": 0, "skipped": 0, "skipped_sessions": {}}
+
+    try:
+        for user_id, sessions in load_user_sessions(root_dir).items():
+            for source in sessions:
+                source = os.path.abspath(source)
+                reason = None
+
+                if previous is not None and previous.is_fresh(source, verify_hash):
+                    seq = previous.load_sequence(source)
+                    sha = previous.entry(source)["sha256"]
+                    reason = previous.entry(source).get("reason")
+                    summary["reused"] += 1
+                else:
+                    sha = file_sha256(source)
+                    summary["parsed"] += 1
+                    # One malformed session (e.g. a non-numeric frame_rate)
+                    # is recorded as skipped instead of ending the build
+                    try:
+                        seq = load_dream_sequence(source)
+                    except Exception as e:
+                        seq, reason = [], f"{type(e).__name__}: {e}"
+
+                length = len(seq)
+                if length == 0:
+                    reason = reason or "no usable frames"
+                    summary["skipped"] += 1
+                    summary["skipped_sessions"][source] = reason
+                else:
+                    for name in COLUMNS:
+                        col = np.ascontiguousarray(getattr(seq, name), dtype=COLUMNS[name][0])
+                        outputs[name].write(col.tobytes())
+
+                entries.append({
+                    "user": user_id,
+                    "session": os.path.basename(source),
+                    "source": source,
+                    "sha256": sha,
+                    **_source_fingerprint(source),
+                    "frame_rate": seq.fps if length else None,
+                    "offset": offset,
+                    "length": length,
+                    "reason": reason,
+                })
+                offset += length
+
+                line = f"[DREAM STORE] {user_id}/{os.path.basename(source)} → {length} frames"
+                if reason:
+                    line += f" (skipped: {reason})"
+                print(line)
+
+        for f in outputs.values():
+            f.close()
+
+        with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+            json.dump({
+                "version": STORE_VERSION,
+                "joints": [name for name, _ in DREAM_JOINTS],
+                "num_frames": offset,
+                "sessions": entries,
+            }, f)
+
+        # Release the memory maps before replacing the old store
+        del previous
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.replace(tmp_dir, store_dir)
+    finally:
+        for f in outputs.values():
+            f.close()
+        # Only left behind when the build did not complete
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    summary["frames"] = offset
+    return summary
@@ -0,0 +1,161 @@
+"""
+Memory-mapped store of step 4 window features for a whole corpus.
+
+Layout of a store directory:
+    index.json      feature names, users, sessions and their row ranges
+    features.f32    float32 (N, F), C order
+
+Every session's (N_windows, F) matrix is appended to one file and the
+index records its [offset, offset + length) rows. Opening the store
+memory-maps the file, so a split of users whose rows are contiguous
+(e.g. a range of users in the order they were written) is a zero-copy
+slice, and RAM stays flat as the corpus grows.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+FEATURE_STORE_VERSION = 1
+INDEX = "index.json"
+DATA = "features.f32"
+
+
+def _old_dir(store_dir):
+    return store_dir.rstrip(os.sep) + ".old"
+
+
+def _recover(store_dir):
+    """Puts the previous store back if a swap was interrupted between its two renames."""
+    old_dir = _old_dir(store_dir)
+    if not os.path.exists(store_dir) and os.path.exists(old_dir):
+        os.replace(old_dir, store_dir)
+
+
+class FeatureStoreWriter:
+    """
+    Appends session feature matrices to a new store. The store is built
+    next to store_dir and swapped in by close() (or on leaving a with
+    block without an exception); an existing store stays readable until
+    then, and is only deleted once the new one is in place.
+    """
+
+    def __init__(self, store_dir, feature_names):
+        self.store_dir = store_dir
+        self.feature_names = list(feature_names)
+
+        self._tmp_dir = store_dir.rstrip(os.sep) + ".tmp"
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        os.makedirs(self._tmp_dir)
+
+        self._data = open(os.path.join(self._tmp_dir, DATA), "wb")
+        self._entries = []
+        self._rows = 0
+
+    def append(self, user, session, X):
+        """Adds one session; X is (N_windows, F). Empty sessions are recorded too."""
+        X = np.ascontiguousarray(X, dtype=np.float32).reshape(-1, len(self.feature_names))
+        self._data.write(X.tobytes())
+
+        self._entries.append({
+            "user": user,
+            "session": session,
+            "offset": self._rows,
+            "length": len(X),
+        })
+        self._rows += len(X)
+
+    def close(self):
+        self._data.close()
+
+        with open(os.path.join(self._tmp_dir, INDEX), "w") as f:
+            json.dump({
+                "version": FEATURE_STORE_VERSION,
+                "feature_names": self.feature_names,
+                "num_rows": self._rows,
+                "sessions": self._entries,
+            }, f)
+
+        # Move the old store aside rather than deleting it first, so a
+        # complete store is always on disk under one of the two names
+        _recover(self.store_dir)
+        old_dir = _old_dir(self.store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.store_dir):
+            os.replace(self.store_dir, old_dir)
+        os.replace(self._tmp_dir, self.store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def abort(self):
+        self._data.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class FeatureStore:
+    """Read side of the store. Cheap to open; rows stay on disk until used."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        _recover(store_dir)
+
+        with open(os.path.join(store_dir, INDEX), "r") as f:
+            self.index = json.load(f)
+
+        if self.index.get("version") != FEATURE_STORE_VERSION:
+            raise ValueError(f"Unsupported feature store version in {store_dir}")
+
+        self.feature_names = self.index["feature_names"]
+        self.entries = self.index["sessions"]
+
+        shape = (self.index["num_rows"], len(self.feature_names))
+        if shape[0] == 0:
+            self.X = np.zeros(shape, dtype=np.float32)
+        else:
+            self.X = np.memmap(os.path.join(store_dir, DATA), dtype=np.float32, mode="r", shape=shape)
+
+    def users(self):
+        """User ids in the order they were written."""
+        return list(dict.fromkeys(e["user"] for e in self.entries))
+
+    def sessions(self, user_ids):
+        """Index entries of the given users' sessions, in store order."""
+        wanted = set(user_ids)
+        return [e for e in self.entries if e["user"] in wanted]
+
+    def session_lengths(self, user_ids):
+        """
+        Window counts of the given users' non-empty sessions, in store
+        order, i.e. the session boundaries inside select(user_ids).
+        """
+        return [e["length"] for e in self.sessions(user_ids) if e["length"]]
+
+    def select(self, user_ids):
+        """
+        (N, F) feature rows of the given users, in store order.
+        A read-only memory-mapped view when their rows are contiguous,
+        otherwise a single concatenated copy.
+        """
+        ranges = []
+        for e in self.sessions(user_ids):
+            start, stop = e["offset"], e["offset"] + e["length"]
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = stop
+            elif stop > start:
+                ranges.append([start, stop])
+
+        if not ranges:
+            return self.X[0:0]
+        if len(ranges) == 1:
+            return self.X[ranges[0][0]:ranges[0][1]]
+        return np.concatenate([self.X[a:b] for a, b in ranges])
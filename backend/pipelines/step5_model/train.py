@@ -80,7 +80,7 @@ def train_autoencoder(
     )
 
     model = TCN_VAE(
-        feature_dim=dataset.X.shape[-1]
+        feature_dim=dataset.feature_dim
     ).to(device)
 
     optimizer = torch.optim.Adam(model.parameters(), lr=lr)
@@ -0,0 +1,18 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipelines.step5_model.dream_store import build_dream_store
+
+# ---------------- CONFIG ----------------
+DREAM_ROOT = "/home/kriti/Downloads/snd1156-1-1"
+DREAM_STORE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "dream_store"
+)
+
+# One-time conversion; re-running only re-parses new or changed sessions
+summary = build_dream_store(DREAM_ROOT, DREAM_STORE)
+
+print("\n[DREAM STORE] Done:")
+for k, v in summary.items():
+    print(f"  {k}: {v}")
@@ -0,0 +1,23 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipelines.step5_model.corpus import extract_corpus
+
+# ---------------- CONFIG ----------------
+DREAM_ROOT = "/home/kriti/Downloads/snd1156-1-1"
+DREAM_STORE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "dream_store"
+)
+NUM_WORKERS = None  # all cores
+
+# Fills the step 4 cache for run_step5.py; safe to interrupt and re-run
+summary = extract_corpus(DREAM_ROOT, num_workers=NUM_WORKERS, dream_store_dir=DREAM_STORE)
+
+print("\n[CORPUS] Done:")
+for k, v in summary.items():
+    if k != "failed_sessions":
+        print(f"  {k}: {v}")
+
+for source, reason in summary["failed_sessions"].items():
+    print(f"  [FAILED] {source}: {reason}")
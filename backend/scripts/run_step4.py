@@ -1,13 +1,17 @@
 from pipelines.step2_preprocessing.preprocess import preprocess_video
+from pipelines.step2_preprocessing.validity import evaluate_video_quality
 from pipelines.step3_pose_gaze.extract import run_step3
 from pipelines.step4_features.extract import extract_features
 
 # Step 2
-step2 = preprocess_video("storage/raw_videos/test_video.mp4")
+step2 = preprocess_video("storage/raw_videos/test_video.mp4", stream=True)
 
 # Step 3
 sequence = run_step3(step2)
 
+decision = evaluate_video_quality([s["valid"] for s in sequence], step2["stats"])
+print("Usable:", decision["usable"], "-", decision["reason"])
+
 # Step 4
 features = extract_features(sequence)
 
@@ -3,57 +3,83 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from pipelines.step5_model.dream_loader import load_user_sessions
+from pipelines.step5_model.dream_store import MANIFEST, DreamStore
+from pipelines.step5_model.feature_store import FeatureStore, FeatureStoreWriter
 from pipelines.step5_model.dataset import WindowSequenceDataset
 from pipelines.step5_model.train import train_autoencoder
 from pipelines.step5_model.score import reconstruction_error
 
 from pipelines.step3_pose_gaze.dream_adapter import load_dream_sequence
-from pipelines.step4_features.extract import extract_features
-from pipelines.step4_features.cache import load_step4, save_step4
+from pipelines.step4_features.engine import FEATURE_NAMES, compute_window_features
+from pipelines.step4_features.cache import default_cache
 
 # ---------------- CONFIG ----------------
 DREAM_ROOT = "/home/kriti/Downloads/snd1156-1-1"
 SEQ_LEN = 10
 
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Built once with scripts/build_dream_store.py; JSON is used when absent or stale
+DREAM_STORE = os.path.join(BACKEND_DIR, "cache", "dream_store")
+
+# Rebuilt on every run from the step 4 cache; holds all windows on disk
+FEATURE_STORE = os.path.join(BACKEND_DIR, "cache", "feature_store")
+
 # ---------------- LOAD DATA ----------------
 users = load_user_sessions(DREAM_ROOT)
 
-user_features = {}
+store = None
+if os.path.exists(os.path.join(DREAM_STORE, MANIFEST)):
+    store = DreamStore(DREAM_STORE)
+
+# Sessions already extracted by scripts/extract_corpus.py are cache hits
+cache = default_cache()
+
+# Users are written in sorted order so every split below is a contiguous
+# row range of the feature store, i.e. a zero-copy slice
+with FeatureStoreWriter(FEATURE_STORE, FEATURE_NAMES) as writer:
+    for user_id in sorted(users):
+        sessions = users[user_id]
+        n_windows = 0
 
-for user_id, sessions in users.items():
-    feats = []
+        print(f"[STEP 5] User {user_id}: {len(sessions)} sessions")
 
-    print(f"[STEP 5] User {user_id}: {len(sessions)} sessions")
+        for i, session in enumerate(sessions, 1):
 
-    for i, session in enumerate(sessions, 1):
+            # Cache check
+            cached = cache.load(session)
+            if cached is not None:
+                X, _ = cached
+                print(f"[STEP 5] Session {i}/{len(sessions)} → cache")
+            else:
+                # Heavy path
+                if store is not None and store.is_fresh(session):
+                    sequence = store.load_sequence(session)
+                else:
+                    sequence = load_dream_sequence(session)
+                if not sequence:
+                    print(f"[STEP 5] Session {i}/{len(sessions)} → skipped")
+                    writer.append(user_id, session, [])
+                    continue
 
-        # Cache check
-        cached = load_step4(session)
-        if cached is not None:
-            feats.extend(cached)
-            print(f"[STEP 5] Session {i}/{len(sessions)} → cache")
-            continue
+                X, names = compute_window_features(sequence)
+                if len(X):
+                    cache.save(session, X, names)
 
-        # Heavy path
-        sequence = load_dream_sequence(session)
-        if not sequence:
-            print(f"[STEP 5] Session {i}/{len(sessions)} → skipped")
-            continue
+                print(f"[STEP 5] Session {i}/{len(sessions)} → processed")
 
-        features = extract_features(sequence)
-        if features:
-            save_step4(session, features)
-            feats.extend(features)
+            writer.append(user_id, session, X)
+            n_windows += len(X)
 
-        print(f"[STEP 5] Session {i}/{len(sessions)} → processed")
+        print(f"[STEP 5] User {user_id} done ({n_windows} windows)")
 
-    user_features[user_id] = feats
-    print(f"[STEP 5] User {user_id} done ({len(feats)} windows)")
+print(f"[STEP 5] Feature cache: {cache.stats}")
 
+features = FeatureStore(FEATURE_STORE)
 
 
 # ---------------- USER SPLIT ----------------
-user_ids = sorted(user_features.keys())
+user_ids = features.users()
 
 n = len(user_ids)
 train_ids = user_ids[:int(0.7 * n)]
@@ -61,35 +87,33 @@ val_ids   = user_ids[int(0.7 * n):int(0.85 * n)]
 test_ids  = user_ids[int(0.85 * n):]
 
 
-def collect(ids):
-    out = []
-    for uid in ids:
-        out.extend(user_features[uid])
-    return out
-
-
-train_feats = collect(train_ids)
-val_feats   = collect(val_ids)
-test_feats  = collect(test_ids)
-
-
 # ---------------- DATASETS ----------------
+# Sequences never cross a session (or user) boundary
 train_ds = WindowSequenceDataset(
-    train_feats,
+    features.select(train_ids),
     seq_len=SEQ_LEN,
-    fit_scaler=True
+    fit_scaler=True,
+    feature_names=features.feature_names,
+    session_lengths=features.session_lengths(train_ids),
+    name="train"
 )
 
 val_ds = WindowSequenceDataset(
-    val_feats,
+    features.select(val_ids),
     seq_len=SEQ_LEN,
-    scaler=train_ds.scaler
+    scaler=train_ds.scaler,
+    feature_names=features.feature_names,
+    session_lengths=features.session_lengths(val_ids),
+    name="val"
 )
 
 test_ds = WindowSequenceDataset(
-    test_feats,
+    features.select(test_ids),
     seq_len=SEQ_LEN,
-    scaler=train_ds.scaler
+    scaler=train_ds.scaler,
+    feature_names=features.feature_names,
+    session_lengths=features.session_lengths(test_ids),
+    name="test"
 )
 
 
@@ -0,0 +1,303 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from pipelines.step2_preprocessing.video_loader import (
+    _open_video,
+    _source_fps,
+    iter_resampled_frames,
+    source_frame_index,
+)
+
+
+def require_mediapipe():
+    mp = pytest.importorskip("mediapipe")
+    if not hasattr(mp, "solutions"):
+        pytest.skip("mediapipe legacy solutions API not available")
+
+
+CLIP_DIR = os.environ.get("STEP2_TEST_CLIPS", "storage/raw_videos")
+CLIPS = sorted(glob.glob(os.path.join(CLIP_DIR, "*.mp4")))
+
+# Frames decoded per clip; enough for several detection intervals
+MAX_FRAMES = 500
+
+
+@pytest.mark.skipif(not CLIPS, reason=f"no recorded clips in {CLIP_DIR}")
+@pytest.mark.parametrize("clip", CLIPS)
+def test_sparse_face_detection_agrees_with_dense(clip):
+    require_mediapipe()
+    from pipelines.step2_preprocessing.face_filter import detect_faces, detect_faces_sparse
+
+    frames = []
+    for frame, _ in iter_resampled_frames(clip):
+        frames.append(frame)
+        if len(frames) >= MAX_FRAMES:
+            break
+
+    dense = detect_faces(frames)
+    sparse, report = detect_faces_sparse(frames, every_n=5)
+
+    assert len(sparse) == len(dense)
+    assert report["frames"] == len(frames)
+    assert report["detector_calls"] + report["saved_calls"] == len(frames)
+    assert report["detector_calls"] <= len(frames) // 2 + 1
+
+    agreement = sum(a == b for a, b in zip(dense, sparse)) / len(dense)
+    assert agreement >= 0.95
+
+
+
+class ScriptedDetector:
+    """
+    Stand-in face detector: frames darker than mid-grey hold one face,
+    brighter ones two. Counts its process() calls.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def process(self, frame):
+        from types import SimpleNamespace
+
+        self.calls += 1
+        n_faces = 1 if frame.mean() < 128 else 2
+        bb = SimpleNamespace(xmin=0.4, ymin=0.3, width=0.2, height=0.25)
+        det = SimpleNamespace(location_data=SimpleNamespace(relative_bounding_box=bb))
+        return SimpleNamespace(detections=[det] * n_faces)
+
+
+def scene_frames(rng):
+    """Scene A (frames 0-11), scene B (12-19), scene A again (20-29), with sensor noise."""
+    levels = [60] * 12 + [190] * 8 + [60] * 10
+    return [
+        np.clip(level + rng.integers(-2, 3, (48, 64, 3)), 0, 255).astype(np.uint8)
+        for level in levels
+    ]
+
+
+def test_face_count_tracker_redetects_on_schedule_and_scene_change():
+    require_mediapipe()
+    from pipelines.step2_preprocessing.face_filter import FaceCountTracker
+
+    frames = scene_frames(np.random.default_rng(0))
+
+    dense_detector = ScriptedDetector()
+    dense = FaceCountTracker(dense_detector, every_n=1)
+    dense_counts = [dense.count(f) for f in frames]
+    assert dense_detector.calls == dense.detector_calls == 30
+
+    detector = ScriptedDetector()
+    tracker = FaceCountTracker(detector, every_n=5, diff_threshold=8.0)
+    counts, boxes = [], []
+    for frame in frames:
+        counts.append(tracker.count(frame))
+        boxes.append(tracker.box)
+
+    # Calls: first frame, every 5th frame after a call, and both scene cuts
+    assert counts == dense_counts == [1] * 12 + [2] * 8 + [1] * 10
+    assert detector.calls == tracker.detector_calls == len([0, 5, 10, 12, 17, 20, 25])
+    assert tracker.report() == {"frames": 30, "detector_calls": 7, "saved_calls": 23}
+
+    # The single-face box is carried forward, and cleared for two faces
+    assert boxes[3] == (0.4, 0.3, 0.2, 0.25)
+    assert all(b is None for b in boxes[12:20])
+    assert boxes[29] == boxes[3]
+
+# Source frame i is a flat grey of value INDEX_STEP * i, so the index of
+# the frame that was kept can be read back after lossy encoding
+INDEX_STEP = 4
+
+
+def write_index_clip(path, fps, num_frames):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("no MJPG video writer available")
+    for i in range(num_frames):
+        writer.write(np.full((48, 64, 3), INDEX_STEP * i, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def kept_source_indices(samples):
+    return [int(round(frame.mean() / INDEX_STEP)) for frame, _ in samples]
+
+
+@pytest.mark.parametrize("fps", [29.97, 15])
+def test_resampling_keeps_nearest_source_frames(tmp_path, fps):
+    path = write_index_clip(tmp_path / "clip.avi", fps, num_frames=int(2 * fps))
+
+    # The container may round the rate; the loader uses what it reports
+    cap = _open_video(path)
+    orig_fps = _source_fps(cap, 25)
+    cap.release()
+
+    samples = list(iter_resampled_frames(path, target_fps=25))
+    assert samples
+
+    expected = [source_frame_index(k, orig_fps, 25) for k in range(len(samples))]
+    assert kept_source_indices(samples) == expected
+    assert [t for _, t in samples] == [k / 25 for k in range(len(samples))]
+
+    # Output ends where the next slot would need a frame past the end
+    assert source_frame_index(len(samples), orig_fps, 25) >= int(2 * fps)
+
+
+@pytest.mark.parametrize("fps", [29.97, 15])
+def test_segments_concatenate_to_a_single_pass(tmp_path, fps):
+    path = write_index_clip(tmp_path / "clip.avi", fps, num_frames=int(2 * fps))
+
+    full = list(iter_resampled_frames(path, target_fps=25))
+    n = len(full)
+
+    for k in (1, n // 3, n // 2, n - 1):
+        head = list(iter_resampled_frames(path, target_fps=25, start=0, stop=k))
+        tail = list(iter_resampled_frames(path, target_fps=25, start=k, stop=n))
+        stitched = head + tail
+
+        assert [t for _, t in stitched] == [t for _, t in full]
+        assert kept_source_indices(stitched) == kept_source_indices(full)
+
+
+def test_batch_quality_matches_per_frame_checks_at_full_scale():
+    from pipelines.step2_preprocessing.quality_checks import (
+        check_frame_quality_batch,
+        is_frame_blurry,
+        is_frame_too_dark,
+    )
+
+    rng = np.random.default_rng(0)
+    frames = []
+    for level in (10, 35, 45, 120, 200):
+        flat = np.full((48, 64, 3), level, dtype=np.uint8)
+        noisy = np.clip(flat + rng.normal(0, 25, flat.shape), 0, 255).astype(np.uint8)
+        smooth = cv2.GaussianBlur(noisy, (9, 9), 3)
+        frames += [flat, noisy, smooth]
+
+    batch = check_frame_quality_batch(frames, scale=1)
+
+    assert batch["too_dark"].tolist() == [bool(is_frame_too_dark(f)) for f in frames]
+    assert batch["blurry"].tolist() == [bool(is_frame_blurry(f)) for f in frames]
+
+    for frame, var in zip(frames, batch["laplacian_var"]):
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        assert var == pytest.approx(cv2.Laplacian(gray, cv2.CV_64F).var(), rel=1e-4, abs=1e-3)
+
+
+QUALITY_RULES = dict(min_valid_frames=60, min_valid_ratio=0.7, max_invalid_gap_sec=1.0, fps=25)
+
+
+def random_mask(rng, n):
+    """Alternating valid / invalid runs, so long gaps actually occur."""
+    mean_valid, mean_invalid = rng.uniform(3, 60), rng.uniform(1, 30)
+    mask, valid = [], bool(rng.integers(2))
+    while len(mask) < n:
+        mask += [valid] * int(rng.geometric(1 / (mean_valid if valid else mean_invalid)))
+        valid = not valid
+    return mask[:n]
+
+
+def random_chunks(rng, mask):
+    i = 0
+    while i < len(mask):
+        size = int(rng.integers(1, 40))
+        yield mask[i:i + size]
+        i += size
+
+
+def rule_fails(reason, mask):
+    from pipelines.step2_preprocessing.validity import longest_invalid_run
+
+    n_valid = sum(mask)
+    rules = QUALITY_RULES
+    return {
+        "TOO_FEW_VALID_FRAMES": n_valid < rules["min_valid_frames"],
+        "LOW_VALID_RATIO": n_valid / len(mask) < rules["min_valid_ratio"],
+        "LONG_INVALID_GAP": longest_invalid_run(mask) / rules["fps"] > rules["max_invalid_gap_sec"],
+    }[reason]
+
+
+@pytest.mark.parametrize("exact_reason", [True, False])
+def test_incremental_quality_agrees_with_full_evaluation(exact_reason):
+    require_mediapipe()
+    from pipelines.step2_preprocessing.validity import (
+        IncrementalQualityEvaluator,
+        evaluate_video_quality,
+    )
+
+    rng = np.random.default_rng(0)
+    early = 0
+
+    for _ in range(400):
+        mask = random_mask(rng, int(rng.integers(1, 400)))
+        stats = {"total_frames": len(mask), "valid_frames": sum(mask)}
+        full = evaluate_video_quality(mask, stats, **QUALITY_RULES)
+
+        # expected_frames is an upper bound on the real length, or unknown
+        expected = None if rng.random() < 0.3 else len(mask) + int(rng.integers(0, 50))
+        evaluator = IncrementalQualityEvaluator(expected, exact_reason=exact_reason, **QUALITY_RULES)
+
+        verdict = None
+        for chunk in random_chunks(rng, mask):
+            verdict = evaluator.update(chunk)
+            if verdict is not None:
+                break
+
+        if verdict is None:
+            assert evaluator.finalize() == full
+            continue
+
+        early += 1
+        assert not full["usable"]
+        if exact_reason:
+            assert verdict == full
+        else:
+            assert rule_fails(verdict["reason"], mask)
+
+    assert early > 50
+
+
+def test_incremental_quality_without_termination_matches_full_evaluation():
+    require_mediapipe()
+    from pipelines.step2_preprocessing.validity import (
+        IncrementalQualityEvaluator,
+        evaluate_video_quality,
+    )
+
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        mask = random_mask(rng, int(rng.integers(1, 400)))
+        stats = {"total_frames": len(mask), "valid_frames": sum(mask)}
+
+        # Ignoring early verdicts, the final one is the full evaluation's
+        evaluator = IncrementalQualityEvaluator(len(mask), **QUALITY_RULES)
+        for chunk in random_chunks(rng, mask):
+            evaluator.update(chunk)
+
+        assert evaluator.finalize() == evaluate_video_quality(mask, stats, **QUALITY_RULES)
+
+
+def test_incremental_gap_scan_joins_runs_across_chunks():
+    require_mediapipe()
+    from pipelines.step2_preprocessing.validity import IncrementalQualityEvaluator
+
+    T, F = True, False
+    evaluator = IncrementalQualityEvaluator()
+
+    evaluator.update([T, F, F])
+    assert (evaluator.max_gap, evaluator.current_gap) == (2, 2)
+
+    # Fully invalid chunk extends the open gap
+    evaluator.update([F, F, F])
+    assert (evaluator.max_gap, evaluator.current_gap) == (5, 5)
+
+    evaluator.update([F, T, F, F, T])
+    assert (evaluator.max_gap, evaluator.current_gap) == (6, 0)
+
+    # A valid chunk start closes the gap
+    evaluator.update([F])
+    evaluator.update([T, F])
+    assert (evaluator.max_gap, evaluator.current_gap) == (6, 1)
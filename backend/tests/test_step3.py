@@ -0,0 +1,262 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from pipelines.step3_pose_gaze.parallel import run_segmented
+
+
+def smooth_sequence(frames, valid_mask, alpha=0.3):
+    """
+    Stand-in for a tracking extractor: exponential smoothing carries
+    state from frame to frame, so cold-started segments differ from the
+    serial run until the state has converged.
+    """
+    out, state = [], None
+    for x, valid in zip(frames, valid_mask):
+        if not valid:
+            out.append(None)
+            continue
+        state = x if state is None else alpha * x + (1 - alpha) * state
+        out.append(float(state))
+    return out
+
+
+def test_segmented_output_is_stitched_in_order():
+    rng = np.random.default_rng(0)
+    frames = list(rng.uniform(0, 1, 400))
+    valid = list(rng.uniform(0, 1, 400) > 0.1)
+
+    serial = smooth_sequence(frames, valid)
+    parallel = run_segmented(smooth_sequence, frames, valid, num_workers=4, warmup=25)
+
+    assert len(parallel) == len(serial)
+    assert [s is None for s in serial] == [p is None for p in parallel]
+
+
+def test_warmup_bounds_difference_from_serial():
+    rng = np.random.default_rng(1)
+    frames = list(rng.uniform(0, 1, 400))
+    valid = [True] * 400
+
+    serial = np.array(smooth_sequence(frames, valid))
+    cold = np.array(run_segmented(smooth_sequence, frames, valid, num_workers=4, warmup=0))
+    warm = np.array(run_segmented(smooth_sequence, frames, valid, num_workers=4, warmup=25))
+
+    # Inputs lie in [0, 1], so after w warm-up frames the state error is
+    # at most (1 - alpha) ** w
+    assert np.max(np.abs(warm - serial)) <= 0.7 ** 25
+    assert np.max(np.abs(warm - serial)) < np.max(np.abs(cold - serial))
+
+
+CLIP_DIR = os.environ.get("STEP2_TEST_CLIPS", "storage/raw_videos")
+CLIPS = sorted(glob.glob(os.path.join(CLIP_DIR, "*.mp4")))
+
+
+@pytest.mark.skipif(not CLIPS, reason=f"no recorded clips in {CLIP_DIR}")
+def test_parallel_pose_close_to_serial_on_clip():
+    mp = pytest.importorskip("mediapipe")
+    if not hasattr(mp, "solutions"):
+        pytest.skip("mediapipe legacy solutions API not available")
+
+    from pipelines.step2_preprocessing.video_loader import iter_resampled_frames
+    from pipelines.step3_pose_gaze.pose_extractor import extract_pose_sequence
+
+    frames = []
+    for frame, _ in iter_resampled_frames(CLIPS[0]):
+        frames.append(frame)
+        if len(frames) >= 300:
+            break
+    valid = [True] * len(frames)
+
+    serial = extract_pose_sequence(frames, valid)
+    parallel = run_segmented(extract_pose_sequence, frames, valid, num_workers=3, warmup=25)
+
+    diffs = [
+        np.abs(s["left_wrist"] - p["left_wrist"]).max()
+        for s, p in zip(serial, parallel)
+        if s is not None and p is not None
+    ]
+    assert diffs
+    assert np.median(diffs) < 0.05
+
+
+def add_offsets(frames, valid_mask, offsets):
+    # Module level so the process pool can pickle it
+    assert len(offsets) == len(frames)
+    return [f + o for f, o in zip(frames, offsets)]
+
+
+def test_segmented_slices_extras_with_frames():
+    frames = list(range(200))
+    valid = [True] * 200
+    offsets = [10 * i for i in range(200)]
+
+    out = run_segmented(add_offsets, frames, valid, num_workers=3, warmup=7, extras=(offsets,))
+    assert out == [11 * i for i in range(200)]
+
+
+def test_face_roi_landmarks_map_back_to_full_frame():
+    mp = pytest.importorskip("mediapipe")
+    if not hasattr(mp, "solutions"):
+        pytest.skip("mediapipe legacy solutions API not available")
+
+    from types import SimpleNamespace
+    from pipelines.step3_pose_gaze.face_mesh import estimate_head_pose, face_roi
+
+    # Fixed landmarks in full-frame coordinates; the stub model reports
+    # them relative to whatever image it is given
+    points = {33: (0.40, 0.30), 263: (0.55, 0.32), 1: (0.48, 0.40)}
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    box = (0.38, 0.25, 0.2, 0.2)
+    _, (x0, y0, cw, ch) = face_roi(frame, box)
+
+    class StubMesh:
+        def __init__(self):
+            self.images = 0
+
+        def process(self, image):
+            self.images += 1
+            h, w = image.shape[:2]
+            cropped = (h, w) != frame.shape[:2]
+            lm = [SimpleNamespace(x=0.0, y=0.0) for _ in range(468)]
+            for idx, (x, y) in points.items():
+                if cropped:
+                    x, y = (x * 640 - x0) / cw, (y * 480 - y0) / ch
+                lm[idx] = SimpleNamespace(x=x, y=y)
+            return SimpleNamespace(multi_face_landmarks=[SimpleNamespace(landmark=lm)])
+
+    tracking, static = StubMesh(), StubMesh()
+    full = estimate_head_pose(tracking, frame, roi_model=static)
+    roi = estimate_head_pose(tracking, frame, box, roi_model=static)
+
+    for k in ("yaw", "pitch", "roll"):
+        assert roi[k] == pytest.approx(full[k], abs=1e-9)
+
+    # Crops never reach the tracking graph
+    assert (tracking.images, static.images) == (1, 1)
+    with pytest.raises(ValueError):
+        estimate_head_pose(tracking, frame, box)
+
+
+def test_keyframes_follow_motion_and_max_skip():
+    from pipelines.step3_pose_gaze.keyframes import select_keyframes
+
+    still = np.full((64, 64, 3), 100, dtype=np.uint8)
+    moved = np.full((64, 64, 3), 160, dtype=np.uint8)
+    frames = [still] * 10 + [moved] * 3 + [still] * 3
+    valid = [True] * 16
+    valid[14] = False
+
+    key = select_keyframes(frames, valid, threshold=3.0, max_skip=4)
+
+    expected = np.zeros(16, dtype=bool)
+    expected[[0, 5, 10, 13, 15]] = True
+    np.testing.assert_array_equal(key, expected)
+
+
+def test_skipped_frames_are_interpolated_within_valid_runs():
+    from pipelines.step3_pose_gaze.keyframes import interpolate_skipped
+    from pipelines.step3_pose_gaze.sequence import PoseGazeSequence
+
+    T = 8
+    seq = PoseGazeSequence.empty(T)
+    seq.valid[:] = [True, True, True, True, False, True, True, True]
+    key = np.array([True, False, False, True, False, True, False, False])
+
+    seq.head[0] = [0.0, 0.0, 0.0]
+    seq.head[3] = [3.0, 6.0, -3.0]
+    seq.head[5] = [1.0, 1.0, 1.0]
+    seq.keyframe = key
+
+    interpolate_skipped(seq, key)
+
+    np.testing.assert_allclose(seq.head[1], [1.0, 2.0, -1.0])
+    np.testing.assert_allclose(seq.head[2], [2.0, 4.0, -2.0])
+    # No keyframe after 5 in its run: the last value is held
+    np.testing.assert_allclose(seq.head[6:], [[1.0, 1.0, 1.0]] * 2)
+    assert np.isnan(seq.head[4]).all()
+    assert seq.skip_ratio == pytest.approx(4 / 7)
+
+
+def reference_dream_frames(data):
+    """The original per-frame DREAM loop, kept as the reference."""
+    skeleton = data.get("skeleton", {})
+    eye, head = data.get("eye_gaze", {}), data.get("head_gaze", {})
+    frame_rate = data.get("frame_rate", 25.0)
+    n_frames = len(skeleton["wrist_left"]["x"])
+
+    shoulder = "shoulder" if "shoulder_left" in skeleton else "sholder"
+    joints = [
+        ("left_wrist", "wrist_left"), ("right_wrist", "wrist_right"),
+        ("left_elbow", "elbow_left"), ("right_elbow", "elbow_right"),
+        ("left_shoulder", f"{shoulder}_left"), ("right_shoulder", f"{shoulder}_right"),
+    ]
+
+    def get_val(source, key, idx):
+        arr = source.get(key, [])
+        if not isinstance(arr, list) or idx >= len(arr) or arr[idx] is None:
+            return 0.0, False
+        return float(arr[idx]), True
+
+    frames = []
+    for i in range(n_frames):
+        pose, valid = {}, True
+        for name, key in joints:
+            (x, vx), (y, _), (z, _) = (get_val(skeleton.get(key, {}), a, i) for a in "xyz")
+            pose[name] = np.array([x, y, z], dtype=np.float32)
+            valid = valid and vx
+
+        frames.append({
+            "t": i / frame_rate,
+            "pose": pose,
+            "head": {"yaw": get_val(head, "ry", i)[0],
+                     "pitch": get_val(head, "rx", i)[0],
+                     "roll": get_val(head, "rz", i)[0]},
+            "gaze": {"gx": get_val(eye, "rx", i)[0], "gy": get_val(eye, "ry", i)[0], "gz": 1.0},
+            "valid": valid,
+        })
+    return frames
+
+
+@pytest.mark.parametrize("shoulder", ["shoulder", "sholder"])
+def test_dream_arrays_match_per_frame_loader(tmp_path, shoulder):
+    import json
+    from pipelines.step3_pose_gaze.dream_adapter import load_dream_sequence
+
+    rng = np.random.default_rng(0)
+    n = 50
+
+    def stream(length=n, nulls=0.1):
+        return [None if rng.random() < nulls else float(v) for v in rng.normal(size=length)]
+
+    skeleton = {
+        key: {"x": stream(), "y": stream(), "z": stream()}
+        for key in ("wrist_left", "wrist_right", "elbow_left", "elbow_right",
+                    f"{shoulder}_left", f"{shoulder}_right")
+    }
+    skeleton["wrist_left"]["x"] = stream(nulls=0.02)
+    skeleton["elbow_right"]["y"] = stream(length=30)      # short stream
+    skeleton["elbow_left"]["z"] = stream(length=70)       # long stream
+    skeleton["wrist_right"]["y"][3] = "0.25"              # numeric string
+    data = {
+        "skeleton": skeleton,
+        "eye_gaze": {"rx": stream(), "ry": "missing"},    # non-list stream
+        "head_gaze": {"rx": stream(), "ry": stream(length=10), "rz": stream()},
+        "frame_rate": 30.0,
+    }
+    path = tmp_path / "session.json"
+    path.write_text(json.dumps(data))
+
+    expected = reference_dream_frames(data)
+    actual = list(load_dream_sequence(str(path)))
+
+    assert len(actual) == len(expected) == n
+    for a, e in zip(actual, expected):
+        assert a["t"] == pytest.approx(e["t"])
+        assert a["valid"] == e["valid"]
+        for name, xyz in e["pose"].items():
+            np.testing.assert_array_equal(a["pose"][name], xyz)
+        for key in ("head", "gaze"):
+            assert a[key] == pytest.approx(e[key], rel=1e-6, abs=1e-7)
@@ -0,0 +1,273 @@
+import numpy as np
+import pytest
+
+from pipelines.step4_features.attention_features import gaze_stability, head_motion
+from pipelines.step4_features.engine import FEATURE_NAMES, compute_window_features
+from pipelines.step4_features.extract import extract_features
+from pipelines.step4_features.motion_features import UPPER_BODY_JOINTS, upper_body_motion_energy
+from pipelines.step4_features.symmetry_features import arm_symmetry
+from pipelines.step4_features.windowing import sliding_windows
+
+
+def reference_features(sequence, fps=25, window_sec=2, stride_sec=1):
+    """The original per-window loop."""
+    window_size = int(round(window_sec * fps))
+    stride = int(round(stride_sec * fps))
+
+    out = []
+    for w in sliding_windows(sequence, window_size, stride):
+        feats = {}
+        feats.update(upper_body_motion_energy(w))
+        feats.update(arm_symmetry(w))
+        feats.update(gaze_stability(w))
+        feats.update(head_motion(w))
+        out.append(feats)
+    return out
+
+
+def make_sequence(T, seed, p_invalid=0.05, p_no_pose=0.1, p_missing_joint=0.0):
+    rng = np.random.default_rng(seed)
+    seq = []
+    for _ in range(T):
+        frame = {"valid": bool(rng.uniform() > p_invalid)}
+
+        if rng.uniform() > p_no_pose:
+            skeleton = {j: rng.normal(size=3).tolist() for j in UPPER_BODY_JOINTS}
+            if rng.uniform() < p_missing_joint:
+                del skeleton["elbow_left"]
+            frame["skeleton"] = skeleton
+        else:
+            frame["skeleton"] = None
+
+        frame["eye_gaze"] = (
+            {"rx": float(rng.normal()), "ry": None if rng.uniform() < 0.1 else float(rng.normal())}
+            if rng.uniform() > 0.1 else None
+        )
+        frame["head_gaze"] = (
+            {"yaw": float(rng.normal()), "pitch": float(rng.normal())}
+            if rng.uniform() > 0.1 else None
+        )
+        seq.append(frame)
+    return seq
+
+
+def assert_same(got, expected):
+    assert len(got) == len(expected)
+    for g, e in zip(got, expected):
+        assert list(g) == list(e)
+        for k in e:
+            assert g[k] == pytest.approx(e[k], rel=1e-4, abs=1e-5), k
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_engine_matches_per_window_functions(seed):
+    seq = make_sequence(400, seed)
+    assert_same(extract_features(seq), reference_features(seq))
+
+
+def test_engine_falls_back_on_missing_joints():
+    seq = make_sequence(300, 7, p_missing_joint=0.05)
+    assert_same(extract_features(seq), reference_features(seq))
+
+
+def test_engine_handles_sparse_pose_and_invalid_runs():
+    seq = make_sequence(300, 11, p_invalid=0.03, p_no_pose=0.9)
+    assert_same(extract_features(seq, fps=30, stride_sec=0.5),
+                reference_features(seq, fps=30, stride_sec=0.5))
+
+
+def test_matrix_output_and_task_columns():
+    seq = make_sequence(200, 3)
+    X, names = compute_window_features(seq, task_name="turn_taking")
+
+    assert X.dtype == np.float32
+    assert names[:len(FEATURE_NAMES)] == FEATURE_NAMES
+    assert X.shape == (len(reference_features(seq)), len(names))
+    np.testing.assert_array_equal(X[:, -3:], [[0, 0, 1]] * len(X))
+
+    with pytest.raises(ValueError):
+        compute_window_features(seq, task_name="unknown")
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_streaming_matches_engine(seed):
+    from pipelines.step4_features.rolling import extract_features_streaming
+
+    seq = make_sequence(2000, seed, p_invalid=0.03, p_no_pose=0.3, p_missing_joint=0.01)
+    assert_same(
+        extract_features_streaming(seq, task_name="imitation"),
+        extract_features(seq, task_name="imitation")
+    )
+
+
+def test_streaming_handles_long_pose_gaps():
+    from pipelines.step4_features.rolling import extract_features_streaming
+
+    seq = make_sequence(600, 5, p_invalid=0.0, p_no_pose=0.97)
+    assert_same(
+        extract_features_streaming(seq, stride_sec=0.2),
+        reference_features(seq, stride_sec=0.2)
+    )
+
+
+def test_rolling_moments_and_max():
+    from pipelines.step4_features.rolling import RollingMax, RollingMoments
+
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=500)
+    x[rng.uniform(size=500) < 0.2] = np.nan
+
+    moments, rmax, W = RollingMoments(), RollingMax(), 37
+    for i, v in enumerate(x):
+        moments.add(v)
+        rmax.push(i, v)
+        if i >= W:
+            moments.remove(x[i - W])
+            rmax.expire(i - W + 1)
+
+        window = x[max(i - W + 1, 0):i + 1]
+        assert moments.count() == np.count_nonzero(~np.isnan(window))
+        assert moments.var == pytest.approx(np.nanvar(window), abs=1e-9)
+        assert rmax.max == np.nanmax(window)
+
+
+def test_feature_subset_computes_only_declared_intermediates():
+    from pipelines.step4_features.engine import required_intermediates
+
+    seq = make_sequence(300, 2)
+    subset = ["head_yaw_std", "motion_max", "eye_gaze_var_rx"]
+
+    full = extract_features(seq)
+    part = extract_features(seq, features=subset)
+    assert [list(d) for d in part] == [subset] * len(full)
+    for f, p in zip(full, part):
+        for k in subset:
+            assert p[k] == f[k]
+
+    assert "wrist_lr_prefix" not in required_intermediates(subset)
+    assert "joint_speeds" not in required_intermediates(["head_yaw_std"])
+
+    with pytest.raises(ValueError):
+        extract_features(seq, features=["not_a_feature"])
+
+
+def test_api_feature_keys_skip_hand_intermediates():
+    from app.config import FEATURE_KEYS
+    from pipelines.step4_features.engine import FEATURE_NAMES, required_intermediates
+
+    # The API's feature list is a subset of the registry, in registry order
+    assert FEATURE_KEYS == [name for name in FEATURE_NAMES if name in FEATURE_KEYS]
+
+    needed = required_intermediates(FEATURE_KEYS)
+    assert {"wrist_lr_prefix", "wrist_lr_moments"} <= set(needed)
+    assert not [name for name in needed if name.startswith("hand_")]
+
+    seq = make_sequence(300, 3)
+    full = extract_features(seq)
+    part = extract_features(seq, features=FEATURE_KEYS)
+    for f, p in zip(full, part):
+        assert p == {k: f[k] for k in FEATURE_KEYS}
+
+
+def test_multiscale_matches_single_scale_runs():
+    from pipelines.step4_features.engine import compute_multiscale_features
+
+    seq = make_sequence(1500, 4, p_invalid=0.01, p_no_pose=0.2, p_missing_joint=0.005)
+    scales = ((1, 0.5), (2, 1), (5, 2.5), (10, 5))
+
+    tensors, names = compute_multiscale_features(seq, scales, task_name="imitation")
+
+    assert list(tensors) == list(scales)
+    for (window_sec, stride_sec), X in tensors.items():
+        single, single_names = compute_window_features(
+            seq, window_sec=window_sec, stride_sec=stride_sec, task_name="imitation"
+        )
+        assert names == single_names
+        np.testing.assert_array_equal(X, single)
+
+
+def test_range_max_matches_direct_max():
+    from pipelines.step4_features.engine import range_max, sparse_table
+
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=257)
+    lo = rng.integers(0, 256, size=500)
+    hi = lo + rng.integers(1, 257 - lo)
+
+    expected = [x[a:b].max() for a, b in zip(lo, hi)]
+    np.testing.assert_array_equal(range_max(sparse_table(x), lo, hi), expected)
+
+
+def test_feature_cache_is_keyed_by_content_and_params(tmp_path):
+    from pipelines.step4_features.cache import FeatureCache
+
+    a = tmp_path / "user1" / "session.json"
+    b = tmp_path / "user2" / "session.json"
+    for path, text in ((a, "one"), (b, "two")):
+        path.parent.mkdir()
+        path.write_text(text)
+
+    cache = FeatureCache(tmp_path / "cache")
+    X = np.arange(6, dtype=np.float64).reshape(2, 3)
+    cache.save(str(a), X, ["f0", "f1", "f2"])
+
+    hit = cache.load(str(a))
+    assert hit is not None
+    assert hit[0].dtype == np.float32
+    np.testing.assert_array_equal(hit[0], X)
+    assert hit[1] == ["f0", "f1", "f2"]
+
+    # Same basename, different content / different parameters: misses
+    assert cache.load(str(b)) is None
+    assert cache.load(str(a), window_sec=5) is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+
+
+def test_feature_cache_evicts_least_recently_used(tmp_path):
+    import os
+    from pipelines.step4_features.cache import FeatureCache
+
+    sources = []
+    for i in range(3):
+        path = tmp_path / f"s{i}.json"
+        path.write_text(str(i))
+        sources.append(str(path))
+
+    cache = FeatureCache(tmp_path / "cache", max_bytes=None)
+    X = np.zeros((100, 11))
+    for i, src in enumerate(sources):
+        cache.save(src, X, [f"f{k}" for k in range(11)])
+        entry = os.path.join(cache.cache_dir, cache.key(src) + ".npz")
+        os.utime(entry, ns=(i * 10**9, i * 10**9))
+
+    # Touch the oldest entry, then shrink the limit to two entries
+    cache.load(sources[0])
+    entry_size = os.path.getsize(entry)
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+
+    assert cache.load(sources[0]) is not None
+    assert cache.load(sources[1]) is None
+    assert cache.load(sources[2]) is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_feature_cache_hit_survives_concurrent_eviction(tmp_path, monkeypatch):
+    import os
+    from pipelines.step4_features import cache as cache_module
+
+    src = tmp_path / "s.json"
+    src.write_text("x")
+    cache = cache_module.FeatureCache(tmp_path / "cache")
+    cache.save(str(src), np.ones((2, 3)), ["f0", "f1", "f2"])
+
+    # Another process deletes the entry between the read and the LRU touch
+    def evicted(path, *args, **kwargs):
+        os.unlink(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(cache_module.os, "utime", evicted)
+    X, names = cache.load(str(src))
+
+    np.testing.assert_array_equal(X, np.ones((2, 3)))
+    assert cache.stats["hits"] == 1
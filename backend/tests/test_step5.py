@@ -0,0 +1,371 @@
+import numpy as np
+import pytest
+
+from pipelines.step5_model.feature_store import FeatureStore, FeatureStoreWriter
+
+NAMES = ["a", "b", "c"]
+
+
+def write_store(path, sessions):
+    with FeatureStoreWriter(str(path), NAMES) as writer:
+        for user, session, X in sessions:
+            writer.append(user, session, X)
+    return FeatureStore(str(path))
+
+
+def test_feature_store_round_trip_and_zero_copy_splits(tmp_path):
+    rng = np.random.default_rng(0)
+    sessions = [
+        ("u1", "s1", rng.normal(size=(5, 3))),
+        ("u1", "s2", []),
+        ("u2", "s1", rng.normal(size=(7, 3))),
+        ("u3", "s1", rng.normal(size=(4, 3))),
+    ]
+    store = write_store(tmp_path / "store", sessions)
+
+    assert store.users() == ["u1", "u2", "u3"]
+    assert store.feature_names == NAMES
+
+    split = store.select(["u1", "u2"])
+    expected = np.concatenate([sessions[0][2], sessions[2][2]]).astype(np.float32)
+    np.testing.assert_array_equal(split, expected)
+
+    # Contiguous users come straight from the memory map
+    assert isinstance(split, np.memmap)
+    assert np.shares_memory(split, store.X)
+
+    # Non-contiguous users are gathered into one copy
+    gathered = store.select(["u1", "u3"])
+    assert not np.shares_memory(gathered, store.X)
+    assert len(gathered) == 9
+    assert len(store.select(["nobody"])) == 0
+
+
+def test_aborted_feature_store_write_keeps_old_store(tmp_path):
+    path = tmp_path / "store"
+    write_store(path, [("u1", "s1", np.ones((2, 3)))])
+
+    try:
+        with FeatureStoreWriter(str(path), NAMES) as writer:
+            writer.append("u2", "s1", np.zeros((3, 3)))
+            raise RuntimeError("interrupted")
+    except RuntimeError:
+        pass
+
+    store = FeatureStore(str(path))
+    assert store.users() == ["u1"]
+    assert not (tmp_path / "store.tmp").exists()
+
+
+def test_feature_store_swap_never_leaves_no_store(tmp_path, monkeypatch):
+    import os
+    from pipelines.step5_model import feature_store
+
+    path = tmp_path / "store"
+    write_store(path, [("u1", "s1", np.ones((2, 3)))])
+
+    # Interrupt the swap after the old store was moved aside
+    real_replace = os.replace
+
+    def interrupted(src, dst):
+        real_replace(src, dst)
+        if str(dst).endswith(".old"):
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(feature_store.os, "replace", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        write_store(path, [("u2", "s1", np.zeros((3, 3)))])
+    monkeypatch.undo()
+
+    assert not path.exists() and (tmp_path / "store.old").exists()
+    assert FeatureStore(str(path)).users() == ["u1"]
+
+    # A completed swap replaces the store and cleans up
+    assert write_store(path, [("u2", "s1", np.zeros((3, 3)))]).users() == ["u2"]
+    assert not (tmp_path / "store.old").exists()
+    assert not (tmp_path / "store.tmp").exists()
+
+
+def write_dream_corpus(root, rng):
+    import json
+
+    def stream(n):
+        return rng.normal(size=n).tolist()
+
+    for u in range(3):
+        user_dir = root / f"User{u}"
+        user_dir.mkdir(parents=True)
+        for s in range(2):
+            n = 200
+            skeleton = {
+                key: {"x": stream(n), "y": stream(n), "z": stream(n)}
+                for key in ("wrist_left", "wrist_right", "elbow_left",
+                            "elbow_right", "sholder_left", "sholder_right")
+            }
+            data = {
+                "skeleton": skeleton,
+                "eye_gaze": {"rx": stream(n), "ry": stream(n)},
+                "head_gaze": {"rx": stream(n), "ry": stream(n), "rz": stream(n)},
+                "frame_rate": 25.0,
+            }
+            (user_dir / f"session{s}.json").write_text(json.dumps(data))
+
+    (root / "User0" / "broken.json").write_text("{not json")
+    (root / "User1" / "bad_rate.json").write_text(json.dumps({
+        "skeleton": {"wrist_left": {"x": [0.0] * 60}},
+        "frame_rate": "fast",
+    }))
+
+
+def test_corpus_extraction_is_parallel_resumable_and_matches_serial(tmp_path):
+    import json
+    from pipelines.step4_features.cache import FeatureCache
+    from pipelines.step5_model.corpus import extract_corpus
+
+    write_dream_corpus(tmp_path / "dream", np.random.default_rng(0))
+    root = str(tmp_path / "dream")
+
+    serial = extract_corpus(root, num_workers=1, cache_dir=str(tmp_path / "serial"))
+    parallel = extract_corpus(root, num_workers=2, cache_dir=str(tmp_path / "parallel"))
+
+    for summary in (serial, parallel):
+        assert (summary["completed"], summary["skipped"], summary["failed"]) == (6, 1, 1)
+        assert list(summary["failed_sessions"]) == [str(tmp_path / "dream" / "User1" / "bad_rate.json")]
+
+    a = FeatureCache(str(tmp_path / "serial"))
+    b = FeatureCache(str(tmp_path / "parallel"))
+    source = str(tmp_path / "dream" / "User2" / "session1.json")
+    np.testing.assert_array_equal(a.load(source)[0], b.load(source)[0])
+
+    # A re-run only retries the failure
+    again = extract_corpus(root, num_workers=2, cache_dir=str(tmp_path / "parallel"))
+    assert again["already_done"] == 7 and again["failed"] == 1
+
+    manifest = json.loads((tmp_path / "parallel" / "corpus_manifest.json").read_text())
+    statuses = sorted(r["status"] for r in manifest["sessions"].values())
+    assert statuses == ["completed"] * 6 + ["failed", "skipped"]
+
+
+def test_window_sequence_dataset_is_a_lazy_view():
+    from pipelines.step5_model.dataset import WindowSequenceDataset
+
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(50, 4)).astype(np.float32)
+    ds = WindowSequenceDataset(features, seq_len=10, fit_scaler=True, feature_names=list("abcd"))
+
+    scaled = ds.scaler.transform(features)
+    expected = np.stack([scaled[i:i + 10] for i in range(41)])
+
+    assert len(ds) == 41
+    assert ds.feature_dim == 4
+    assert np.shares_memory(ds._windows, ds.features)
+    np.testing.assert_allclose(ds[7], expected[7], rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(ds.get_batch([0, 40, 3]), expected[[0, 40, 3]], rtol=1e-5, atol=1e-6)
+
+    # Iteration (as reconstruction_error does) stops at the end
+    assert sum(1 for _ in ds) == 41
+
+
+def test_window_sequence_dataset_respects_session_boundaries(tmp_path):
+    from pipelines.step5_model.dataset import WindowSequenceDataset
+
+    rng = np.random.default_rng(1)
+    store = write_store(tmp_path / "store", [
+        ("u1", "s1", rng.normal(size=(6, 3))),
+        ("u1", "s2", []),
+        ("u1", "s3", rng.normal(size=(2, 3))),   # shorter than seq_len
+        ("u2", "s1", rng.normal(size=(5, 3))),
+    ])
+    assert store.session_lengths(["u1", "u2"]) == [6, 2, 5]
+
+    ds = WindowSequenceDataset(
+        store.select(["u1", "u2"]),
+        seq_len=4,
+        fit_scaler=True,
+        feature_names=NAMES,
+        session_lengths=store.session_lengths(["u1", "u2"])
+    )
+
+    # 3 starts in the first session, none in the second, 2 in the last
+    np.testing.assert_array_equal(ds.starts, [0, 1, 2, 8, 9])
+    assert len(ds) == 5
+    scaled = ds.scaler.transform(store.select(["u1", "u2"]))
+    np.testing.assert_allclose(ds[3], scaled[8:12], rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(ds.get_batch([0, 4]), [scaled[0:4], scaled[9:13]], rtol=1e-5, atol=1e-6)
+    assert sum(1 for _ in ds) == 5
+
+    with pytest.raises(ValueError, match="val split"):
+        WindowSequenceDataset(
+            store.select(["u1"]),
+            seq_len=7,
+            scaler=ds.scaler,
+            feature_names=NAMES,
+            session_lengths=store.session_lengths(["u1"]),
+            name="val"
+        )
+
+
+def assert_same_sequence(a, b):
+    for name in ("t", "valid", "pose", "head", "gaze"):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+    assert a.joints == b.joints
+    assert a.fps == b.fps
+
+
+def test_dream_store_round_trip_matches_json(tmp_path):
+    from pipelines.step3_pose_gaze.dream_adapter import load_dream_sequence
+    from pipelines.step5_model.dream_store import DreamStore, build_dream_store
+
+    write_dream_corpus(tmp_path / "dream", np.random.default_rng(0))
+    store_dir = str(tmp_path / "store")
+
+    summary = build_dream_store(str(tmp_path / "dream"), store_dir)
+    assert (summary["parsed"], summary["reused"], summary["skipped"]) == (8, 0, 2)
+    assert not (tmp_path / "store.tmp").exists()
+
+    store = DreamStore(store_dir)
+    for sessions in store.users().values():
+        for source in sessions:
+            if store.entry(source)["length"] == 0:
+                assert store.load_sequence(source) == []
+                continue
+            assert_same_sequence(store.load_sequence(source), load_dream_sequence(source))
+
+
+def test_dream_store_skips_malformed_sessions(tmp_path):
+    from pipelines.step5_model.dream_store import DreamStore, build_dream_store
+
+    write_dream_corpus(tmp_path / "dream", np.random.default_rng(0))
+    summary = build_dream_store(str(tmp_path / "dream"), str(tmp_path / "store"))
+
+    bad_rate = str(tmp_path / "dream" / "User1" / "bad_rate.json")
+    broken = str(tmp_path / "dream" / "User0" / "broken.json")
+    assert summary["skipped_sessions"][bad_rate].startswith("TypeError")
+    assert summary["skipped_sessions"][broken] == "no usable frames"
+
+    store = DreamStore(str(tmp_path / "store"))
+    assert store.entry(bad_rate)["reason"].startswith("TypeError")
+    assert store.load_sequence(bad_rate) == []
+
+    # Reused on the next build, reason included
+    again = build_dream_store(str(tmp_path / "dream"), str(tmp_path / "store"))
+    assert (again["parsed"], again["reused"]) == (0, 8)
+    assert again["skipped_sessions"] == summary["skipped_sessions"]
+
+
+def test_dream_store_tracks_changed_sources(tmp_path):
+    import json
+    import os
+    from pipelines.step3_pose_gaze.dream_adapter import load_dream_sequence
+    from pipelines.step5_model.dream_store import DreamStore, build_dream_store
+
+    write_dream_corpus(tmp_path / "dream", np.random.default_rng(0))
+    store_dir = str(tmp_path / "store")
+    build_dream_store(str(tmp_path / "dream"), store_dir)
+
+    source = tmp_path / "dream" / "User2" / "session0.json"
+    assert DreamStore(store_dir).is_fresh(str(source))
+
+    data = json.loads(source.read_text())
+    data["frame_rate"] = 30.0
+    source.write_text(json.dumps(data))
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    store = DreamStore(store_dir)
+    assert not store.is_fresh(str(source))
+    assert store.stale_sources(str(tmp_path / "dream")) == [str(source)]
+    del store
+
+    summary = build_dream_store(str(tmp_path / "dream"), store_dir)
+    assert (summary["parsed"], summary["reused"]) == (1, 7)
+    assert_same_sequence(DreamStore(store_dir).load_sequence(str(source)), load_dream_sequence(str(source)))
+
+
+def test_interrupted_dream_store_build_leaves_no_temp_dir(tmp_path, monkeypatch):
+    from pipelines.step5_model import dream_store
+
+    write_dream_corpus(tmp_path / "dream", np.random.default_rng(0))
+
+    def interrupt(path):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(dream_store, "load_dream_sequence", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        dream_store.build_dream_store(str(tmp_path / "dream"), str(tmp_path / "store"))
+
+    assert not (tmp_path / "store.tmp").exists()
+    assert not (tmp_path / "store").exists()
+
+
+def test_corpus_resume_re_extracts_evicted_sessions(tmp_path):
+    import os
+    from pipelines.step4_features.cache import FeatureCache
+    from pipelines.step5_model.corpus import extract_corpus
+
+    write_dream_corpus(tmp_path / "dream", np.random.default_rng(0))
+    root = str(tmp_path / "dream")
+    cache_dir = str(tmp_path / "cache")
+    sources = [
+        str(tmp_path / "dream" / f"User{u}" / f"session{s}.json")
+        for u in range(3) for s in range(2)
+    ]
+
+    # A limit far below one entry: this run's entries are still kept
+    first = extract_corpus(root, num_workers=1, cache_dir=cache_dir, max_cache_bytes=1)
+    assert first["completed"] == 6
+    cache = FeatureCache(cache_dir)
+    assert all(cache.load(src) is not None for src in sources)
+
+    # An entry evicted after the run is extracted again, not trusted
+    os.unlink(os.path.join(cache_dir, cache.key(sources[0]) + ".npz"))
+    again = extract_corpus(root, num_workers=1, cache_dir=cache_dir)
+    assert (again["completed"], again["already_done"]) == (1, 6)
+    assert cache.load(sources[0]) is not None
+
+
+def test_corpus_resume_does_not_rehash_sources(tmp_path, monkeypatch):
+    from pipelines.step4_features import cache as cache_module
+    from pipelines.step5_model.corpus import extract_corpus
+
+    write_dream_corpus(tmp_path / "dream", np.random.default_rng(0))
+    root = str(tmp_path / "dream")
+    extract_corpus(root, num_workers=1, cache_dir=str(tmp_path / "cache"))
+
+    hashed = []
+    monkeypatch.setattr(cache_module, "file_sha256", lambda path: hashed.append(path))
+    again = extract_corpus(root, num_workers=1, cache_dir=str(tmp_path / "cache"))
+
+    # Completed sessions are trusted by their recorded key; the retried
+    # failure never reaches the cache
+    assert again["already_done"] == 7
+    assert hashed == []
+
+
+def test_window_sequence_dataset_keeps_memmapped_features_on_disk(tmp_path, monkeypatch):
+    from sklearn.preprocessing import StandardScaler
+    from pipelines.step5_model import dataset
+
+    rng = np.random.default_rng(2)
+    store = write_store(tmp_path / "store", [
+        ("u1", "s1", rng.normal(3.0, 2.0, size=(120, 3))),
+        ("u2", "s1", rng.normal(-1.0, 0.5, size=(80, 3))),
+    ])
+    rows = store.select(["u1", "u2"])
+
+    # Small chunks, so the scaler really is fitted incrementally
+    monkeypatch.setattr(dataset, "SCALER_CHUNK_ROWS", 17)
+    ds = dataset.WindowSequenceDataset(rows, seq_len=5, fit_scaler=True, feature_names=NAMES)
+
+    assert np.shares_memory(ds.features, store.X)
+    reference = StandardScaler().fit(rows)
+    np.testing.assert_allclose(ds.scaler.mean_, reference.mean_, rtol=1e-10)
+    np.testing.assert_allclose(ds.scaler.scale_, reference.scale_, rtol=1e-10)
+
+    scaled = ds.scaler.transform(rows)
+    np.testing.assert_allclose(ds[10], scaled[10:15], rtol=1e-5, atol=1e-6)
+    assert ds[10].dtype == np.float32 and ds[10].flags.writeable
+    np.testing.assert_allclose(ds.get_batch([0, 195]), [scaled[0:5], scaled[195:200]], rtol=1e-5, atol=1e-6)
+
+    with pytest.raises(Exception, match="not fitted"):
+        dataset.WindowSequenceDataset(rows, seq_len=5, scaler=StandardScaler())